@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, literal
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.schemas import AlertResponse, AlertAcknowledge
@@ -26,8 +27,7 @@ async def get_alerts(microgrid_id: str, limit: int = 20, db: Session = Depends(g
             logger.info(f"No alerts found for {microgrid_id}, generating default system alerts")
             # Check if microgrid exists (system is running)
             from app.models.database import Microgrid
-            microgrid = db.query(Microgrid).filter(Microgrid.id == microgrid_id).first()
-            if microgrid:
+            if db.scalar(select(literal(1)).where(Microgrid.id == microgrid_id)) is not None:
                 # Generate default system alerts
                 now = datetime.utcnow()
                 default_alerts = [
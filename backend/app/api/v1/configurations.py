@@ -7,7 +7,8 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 
 from app.core.database import get_db
-from app.models.database import SystemConfiguration, Microgrid
+from app.api.v1.microgrid import ensure_microgrid_exists
+from app.models.database import SystemConfiguration
 from app.models.schemas import (
     SystemConfigurationResponse,
     SystemConfigurationUpdate
@@ -23,9 +24,7 @@ async def get_configuration(
 ):
     """Get system configuration for a microgrid."""
     # Verify microgrid exists
-    microgrid = db.query(Microgrid).filter(Microgrid.id == microgrid_id).first()
-    if not microgrid:
-        raise HTTPException(status_code=404, detail=f"Microgrid {microgrid_id} not found")
+    ensure_microgrid_exists(db, microgrid_id)
     
     config = db.query(SystemConfiguration).filter(
         SystemConfiguration.microgrid_id == microgrid_id
@@ -68,9 +67,7 @@ async def update_configuration(
 ):
     """Update system configuration for a microgrid."""
     # Verify microgrid exists
-    microgrid = db.query(Microgrid).filter(Microgrid.id == microgrid_id).first()
-    if not microgrid:
-        raise HTTPException(status_code=404, detail=f"Microgrid {microgrid_id} not found")
+    ensure_microgrid_exists(db, microgrid_id)
     
     config = db.query(SystemConfiguration).filter(
         SystemConfiguration.microgrid_id == microgrid_id
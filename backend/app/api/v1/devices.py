@@ -8,7 +8,8 @@ from typing import List
 from datetime import datetime
 
 from app.core.database import get_db
-from app.models.database import Device, Microgrid
+from app.api.v1.microgrid import ensure_microgrid_exists
+from app.models.database import Device
 from app.models.schemas import (
     DeviceCreate,
     DeviceUpdate,
@@ -26,9 +27,7 @@ async def create_device(
 ):
     """Create a new device for a microgrid."""
     # Verify microgrid exists
-    microgrid = db.query(Microgrid).filter(Microgrid.id == microgrid_id).first()
-    if not microgrid:
-        raise HTTPException(status_code=404, detail=f"Microgrid {microgrid_id} not found")
+    ensure_microgrid_exists(db, microgrid_id)
     
     # Validate device type
     if device.device_type not in ['essential', 'flexible', 'optional']:
@@ -8,7 +8,8 @@ from typing import List, Optional
 import logging
 
 from app.core.database import get_db
-from app.models.database import SystemConfiguration, Microgrid
+from app.api.v1.microgrid import ensure_microgrid_exists
+from app.models.database import SystemConfiguration
 from app.models.schemas import (
     GridProvider,
     GridProviderListResponse,
@@ -133,9 +134,7 @@ async def get_grid_providers(
     """
     try:
         # Verify microgrid exists
-        microgrid = db.query(Microgrid).filter(Microgrid.id == microgrid_id).first()
-        if not microgrid:
-            raise HTTPException(status_code=404, detail=f"Microgrid {microgrid_id} not found")
+        ensure_microgrid_exists(db, microgrid_id)
         
         # Get available providers for location
         providers = get_available_providers_for_location(lat, lon)
@@ -180,9 +179,7 @@ async def select_grid_provider(
     """
     try:
         # Verify microgrid exists
-        microgrid = db.query(Microgrid).filter(Microgrid.id == microgrid_id).first()
-        if not microgrid:
-            raise HTTPException(status_code=404, detail=f"Microgrid {microgrid_id} not found")
+        ensure_microgrid_exists(db, microgrid_id)
         
         # Find the selected provider
         provider = None
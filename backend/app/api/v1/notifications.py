@@ -1,18 +1,42 @@
 """
 Notification API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Body, Response
+from sqlalchemy import select, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db, dialect_insert
+from app.core.cache import cache_get, cache_set, cache_delete, notification_preferences_key
 from app.models.database import NotificationPreference, Microgrid
 from app.services.notification_service import notification_service
+from cachetools import TTLCache
 from typing import Optional, Dict
-from pydantic import BaseModel
+from types import MappingProxyType
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+import orjson
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Preferences only change through update_notification_preferences, which drops both cache tiers.
+# The in-process tier is kept short since other workers' copies expire rather than being dropped
+PREFERENCES_CACHE_TTL_SECONDS = 60
+LOCAL_PREFERENCES_CACHE_TTL_SECONDS = 30
+_preferences_cache = TTLCache(maxsize=1024, ttl=LOCAL_PREFERENCES_CACHE_TTL_SECONDS)
+
+# Preferences of a microgrid that has not saved any (read-only)
+_DEFAULT_PREFS = MappingProxyType({
+    "phone_number": None,
+    "email": None,
+    "enable_sms": True,
+    "enable_email": False,
+    "enable_critical_alerts": True,
+    "enable_warning_alerts": True,
+    "enable_info_alerts": False,
+    "enable_forecast_updates": False
+})
+
 
 class NotificationPreferenceRequest(BaseModel):
     phone_number: Optional[str] = None
@@ -25,111 +49,106 @@ class NotificationPreferenceRequest(BaseModel):
     enable_forecast_updates: bool = False
 
 
+class NotificationPreferenceResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    microgrid_id: str
+    phone_number: Optional[str] = None
+    email: Optional[str] = None
+    enable_sms: bool
+    enable_email: bool
+    enable_critical_alerts: bool
+    enable_warning_alerts: bool
+    enable_info_alerts: bool
+    enable_forecast_updates: bool
+
+
+class NotificationPreferenceUpdateResponse(BaseModel):
+    status: str
+    preferences: NotificationPreferenceResponse
+
+
 class SendNotificationRequest(BaseModel):
     phone_number: str
     message: str
 
 
-@router.get("/preferences/{microgrid_id}")
+@router.get("/preferences/{microgrid_id}", response_model=NotificationPreferenceResponse)
 async def get_notification_preferences(
     microgrid_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get notification preferences for a microgrid"""
-    prefs = db.query(NotificationPreference).filter(
-        NotificationPreference.microgrid_id == microgrid_id
-    ).first()
+    prefs_json = _preferences_cache.get(microgrid_id)
+    if prefs_json is None:
+        prefs_json = await cache_get(notification_preferences_key(microgrid_id))
+        if prefs_json is None:
+            prefs_json = orjson.dumps(await _load_preferences(microgrid_id, db))
+            await cache_set(notification_preferences_key(microgrid_id), prefs_json, ttl_seconds=PREFERENCES_CACHE_TTL_SECONDS)
+        _preferences_cache[microgrid_id] = prefs_json
+    return Response(content=prefs_json, media_type="application/json")
+
+
+async def _load_preferences(microgrid_id: str, db: AsyncSession) -> Dict:
+    prefs = (await db.execute(
+        select(NotificationPreference).where(NotificationPreference.microgrid_id == microgrid_id)
+    )).scalars().first()
     
     if not prefs:
         # Return defaults
-        return {
-            "microgrid_id": microgrid_id,
-            "phone_number": None,
-            "email": None,
-            "enable_sms": True,
-            "enable_email": False,
-            "enable_critical_alerts": True,
-            "enable_warning_alerts": True,
-            "enable_info_alerts": False,
-            "enable_forecast_updates": False
-        }
+        return {"microgrid_id": microgrid_id, **_DEFAULT_PREFS}
     
-    return {
-        "microgrid_id": prefs.microgrid_id,
-        "phone_number": prefs.phone_number,
-        "email": prefs.email,
-        "enable_sms": prefs.enable_sms,
-        "enable_email": prefs.enable_email,
-        "enable_critical_alerts": prefs.enable_critical_alerts,
-        "enable_warning_alerts": prefs.enable_warning_alerts,
-        "enable_info_alerts": prefs.enable_info_alerts,
-        "enable_forecast_updates": prefs.enable_forecast_updates
-    }
-
-
-@router.post("/preferences/{microgrid_id}")
+    return NotificationPreferenceResponse.model_validate(prefs).model_dump()
+
+
+@router.post("/preferences/{microgrid_id}", response_model=NotificationPreferenceUpdateResponse)
 async def update_notification_preferences(
     microgrid_id: str,
     preferences: NotificationPreferenceRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update notification preferences for a microgrid"""
-    # Verify microgrid exists
-    microgrid = db.query(Microgrid).filter(Microgrid.id == microgrid_id).first()
-    if not microgrid:
-        raise HTTPException(status_code=404, detail=f"Microgrid {microgrid_id} not found")
+    # Every field is written - omitted ones fall back to the request defaults, as before
+    values = preferences.model_dump()
+    columns = NotificationPreference.__table__.c
     
-    prefs = db.query(NotificationPreference).filter(
-        NotificationPreference.microgrid_id == microgrid_id
-    ).first()
-    
-    if not prefs:
-        prefs = NotificationPreference(
-            microgrid_id=microgrid_id,
-            phone_number=preferences.phone_number,
-            email=preferences.email,
-            enable_sms=preferences.enable_sms,
-            enable_email=preferences.enable_email,
-            enable_critical_alerts=preferences.enable_critical_alerts,
-            enable_warning_alerts=preferences.enable_warning_alerts,
-            enable_info_alerts=preferences.enable_info_alerts,
-            enable_forecast_updates=preferences.enable_forecast_updates
-        )
-        db.add(prefs)
-    else:
-        prefs.phone_number = preferences.phone_number
-        prefs.email = preferences.email
-        prefs.enable_sms = preferences.enable_sms
-        prefs.enable_email = preferences.enable_email
-        prefs.enable_critical_alerts = preferences.enable_critical_alerts
-        prefs.enable_warning_alerts = preferences.enable_warning_alerts
-        prefs.enable_info_alerts = preferences.enable_info_alerts
-        prefs.enable_forecast_updates = preferences.enable_forecast_updates
+    # One statement: insert-or-update, selecting from the microgrid row itself so an
+    # unknown microgrid inserts (and returns) nothing - no separate existence check
+    upsert = dialect_insert(db.get_bind())(NotificationPreference).from_select(
+        ['microgrid_id', *values],
+        select(
+            Microgrid.id,
+            *(literal(value, type_=columns[field].type) for field, value in values.items())
+        ).where(Microgrid.id == microgrid_id)
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=['microgrid_id'],
+        set_={**values, 'updated_at': datetime.utcnow()}
+    ).returning(*columns)
     
-    db.commit()
+    prefs = (await db.execute(upsert)).first()
+    if prefs is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail=f"Microgrid {microgrid_id} not found")
+    await db.commit()
+    _preferences_cache.pop(microgrid_id, None)
+    await cache_delete(notification_preferences_key(microgrid_id))
     
-    return {"status": "success", "preferences": {
-        "microgrid_id": prefs.microgrid_id,
-        "phone_number": prefs.phone_number,
-        "email": prefs.email,
-        "enable_sms": prefs.enable_sms,
-        "enable_email": prefs.enable_email,
-        "enable_critical_alerts": prefs.enable_critical_alerts,
-        "enable_warning_alerts": prefs.enable_warning_alerts,
-        "enable_info_alerts": prefs.enable_info_alerts,
-        "enable_forecast_updates": prefs.enable_forecast_updates
-    }}
+    return NotificationPreferenceUpdateResponse(
+        status="success",
+        preferences=NotificationPreferenceResponse.model_validate(prefs)
+    )
 
 
 @router.post("/send-test/{microgrid_id}")
 async def send_test_notification(
     microgrid_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a test SMS notification"""
-    prefs = db.query(NotificationPreference).filter(
-        NotificationPreference.microgrid_id == microgrid_id
-    ).first()
+    prefs = (await db.execute(
+        select(NotificationPreference).where(NotificationPreference.microgrid_id == microgrid_id)
+    )).scalars().first()
     
     if not prefs or not prefs.phone_number:
         raise HTTPException(
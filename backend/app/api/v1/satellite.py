@@ -1,17 +1,259 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import Response
 from app.services.satellite_ingest import SatelliteDataIngester
+from app.services.irradiance_predictor import IrradiancePredictor
 from app.core.config import settings
+from functools import lru_cache
 import base64
 import io
+import logging
+import traceback
 from PIL import Image
 import numpy as np
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Try to import pybase64 (SIMD base64) for encoding images
+try:
+    import pybase64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    PYBASE64_AVAILABLE = False
+    logger.warning("pybase64 not installed. Images will be base64 encoded with the standard library.")
+
+
+# Try to import Numba for the threshold cloud mask
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.warning("Numba not installed. Threshold cloud masks will be computed with NumPy.")
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit"""
+        def decorator(func):
+            return func
+        return decorator
+
+# Try to import imagecodecs (libpng/zlib-ng) for encoding PNGs without PIL
+try:
+    from imagecodecs import png_encode
+    IMAGECODECS_AVAILABLE = True
+except ImportError:
+    IMAGECODECS_AVAILABLE = False
+    logger.warning("imagecodecs not installed. PNGs will be encoded with PIL.")
+
+# Try to import msgpack for binary cloud-overlay responses (Accept: application/msgpack)
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    logger.warning("msgpack not installed. Cloud overlays will only be served as JSON.")
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Responses are transient - encode latency matters more than a few extra bytes
+# (hq=1 asks for the smaller, slower encoding)
+PNG_COMPRESS_LEVEL = 1
+PNG_HQ_COMPRESS_LEVEL = 6
+
+# Cloud overlays have a handful of cloud colors over the imagery - an adaptive palette of this
+# many colors cuts the PNG to about a fifth of its RGB size
+OVERLAY_PALETTE_COLORS = 64
+
+
+def _encode_png(rgb_image: np.ndarray, compress_level: int = PNG_COMPRESS_LEVEL) -> bytes:
+    """PNG bytes of an (H, W, 3) uint8 image"""
+    if IMAGECODECS_AVAILABLE:
+        # The encoder needs contiguous rows - RGB views of 6-channel images are not
+        return png_encode(np.ascontiguousarray(rgb_image), level=compress_level)
+    buffer = io.BytesIO()
+    Image.fromarray(rgb_image, mode='RGB').save(buffer, format="PNG", compress_level=compress_level)
+    return buffer.getvalue()
+
+
+def _encode_palette_png(rgb_image: np.ndarray) -> bytes:
+    """PNG bytes of an (H, W, 3) uint8 image quantized to OVERLAY_PALETTE_COLORS colors"""
+    palette_image = Image.fromarray(rgb_image, mode='RGB').convert(
+        'P', palette=Image.ADAPTIVE, colors=OVERLAY_PALETTE_COLORS
+    )
+    buffer = io.BytesIO()
+    palette_image.save(buffer, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return buffer.getvalue()
+
+
+def _encode_overlay(rgb_image: np.ndarray, hq: bool) -> bytes:
+    """Cloud overlay PNG - palette by default, full color at PNG_HQ_COMPRESS_LEVEL for hq"""
+    if hq:
+        return _encode_png(rgb_image, PNG_HQ_COMPRESS_LEVEL)
+    return _encode_palette_png(rgb_image)
+
+
+def _b64encode(data: bytes) -> str:
+    """Base64 text of data, straight to str with pybase64 (no separate decode copy)"""
+    if PYBASE64_AVAILABLE:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode('ascii')
 
 # Initialize satellite ingester
 satellite_ingester = SatelliteDataIngester(use_mock=settings.USE_MOCK_DATA)
 
+
+@lru_cache(maxsize=1)
+def _get_predictor() -> IrradiancePredictor:
+    """The predictor whose cloud detector masks overlays - its models are loaded once, on first use"""
+    return IrradiancePredictor()
+
+# Cloud mask encodings of the JSON responses (msgpack always carries the raw bytes)
+MASK_FORMATS = ("base64", "png", "json")
+MAX_MASK_SCALE = 16
+
+# Overlay color and opacity per cloud class, indexed by the cloud mask value:
+# clear=transparent, thin=light blue, thick=gray, storm=dark gray
+CLOUD_COLOR_TABLE = np.array([
+    [0, 0, 0],
+    [135, 206, 235],
+    [128, 128, 128],
+    [64, 64, 64]
+], dtype=np.float32)
+CLOUD_ALPHA_TABLE = np.array([0, 100, 150, 200], dtype=np.float32) / 255.0
+# The blend per cloud class, precomputed: image * keep + tint
+CLOUD_KEEP_TABLE = 1.0 - CLOUD_ALPHA_TABLE
+CLOUD_TINT_TABLE = CLOUD_COLOR_TABLE * CLOUD_ALPHA_TABLE[:, np.newaxis]
+
+
+def _to_uint8(image: np.ndarray) -> np.ndarray:
+    """Clip to [0, 255] written straight into a new uint8 array - no full-size intermediate"""
+    out = np.empty(image.shape, dtype=np.uint8)
+    np.clip(image, 0, 255, out=out, casting='unsafe')
+    return out
+
+
+# Mean RGB brightness above which a pixel counts as thin cloud, thick cloud and storm
+# (the fallback when the ML cloud detector is unavailable)
+CLOUD_BRIGHTNESS_THRESHOLDS = (200.0, 220.0, 240.0)
+
+
+# Serial on purpose: the scan is memory-bound, and Numba's parallel thread pool keeps the
+# process from exiting when it was started from a worker thread (the request threadpool)
+@njit(fastmath=True, cache=True)
+def _classify_clouds(image, out, thresholds):
+    """Brightness and cloud class of every pixel in one fused scan over the image"""
+    height, width = out.shape
+    for y in range(height):
+        for x in range(width):
+            gray = (float(image[y, x, 0]) + float(image[y, x, 1]) + float(image[y, x, 2])) / 3.0
+            cloud_class = 0
+            for threshold in thresholds:
+                if gray > threshold:
+                    cloud_class += 1
+            out[y, x] = cloud_class
+
+
+def _threshold_cloud_mask(image: np.ndarray) -> np.ndarray:
+    """Cloud classes 0-3 from RGB brightness alone"""
+    if NUMBA_AVAILABLE:
+        cloud_mask = np.empty(image.shape[:2], dtype=np.uint8)
+        _classify_clouds(image, cloud_mask, CLOUD_BRIGHTNESS_THRESHOLDS)
+        return cloud_mask
+    gray = np.mean(image[:, :, :3], axis=2)
+    # Number of thresholds each pixel is brighter than
+    return np.digitize(gray, CLOUD_BRIGHTNESS_THRESHOLDS, right=True).astype(np.uint8)
+
+
+def _encode_mask(mask: np.ndarray) -> dict:
+    """A cloud mask as base64 uint8 bytes - a fraction of the size of nested JSON lists"""
+    mask_bytes = np.ascontiguousarray(mask, dtype=np.uint8).tobytes()
+    return {
+        "data": _b64encode(mask_bytes),
+        "shape": list(mask.shape),
+        "dtype": "uint8"
+    }
+
+
+def _encode_mask_png(mask: np.ndarray) -> dict:
+    """
+    A cloud mask as a base64 2-bit palette PNG - the pixel values are the palette indices,
+    and the palette is the overlay colors, so the mask can also be drawn as-is
+    """
+    mask_image = Image.fromarray(np.ascontiguousarray(mask, dtype=np.uint8), mode='P')
+    mask_image.putpalette(CLOUD_COLOR_TABLE.astype(np.uint8).ravel().tolist())
+    buffer = io.BytesIO()
+    mask_image.save(buffer, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+    return {
+        "data": _b64encode(buffer.getvalue()),
+        "shape": list(mask.shape),
+        "dtype": "uint8",
+        "encoding": "png"
+    }
+
+
+def _downsample_mask(mask: np.ndarray, factor: int) -> np.ndarray:
+    """
+    The densest cloud class of every factor x factor block (edge blocks padded with their
+    last row/column), so thick clouds and storms survive the downsampling
+    """
+    if factor == 1:
+        return mask
+    height, width = mask.shape
+    padded = np.pad(mask, ((0, -height % factor), (0, -width % factor)), mode='edge')
+    blocks = padded.reshape(padded.shape[0] // factor, factor, padded.shape[1] // factor, factor)
+    return blocks.max(axis=(1, 3))
+
+
+def _accepts_msgpack(request: Request) -> bool:
+    """Whether the client asked for msgpack and it can be produced"""
+    return MSGPACK_AVAILABLE and MSGPACK_MEDIA_TYPE in request.headers.get('accept', '')
+
+
+def _pack_mask(mask: np.ndarray) -> dict:
+    """A cloud mask for msgpack - the raw uint8 buffer as a bin field, no base64 or lists"""
+    return {
+        "data": memoryview(np.ascontiguousarray(mask, dtype=np.uint8)).cast('B'),
+        "shape": list(mask.shape),
+        "dtype": "uint8"
+    }
+
+
+@lru_cache(maxsize=8)
+def _visibility_gradient(height: int, width: int) -> np.ndarray:
+    """
+    (height, width, 1) int16 gradient added to low-contrast images - tiles come in a few
+    fixed sizes, so each is built once. Read-only, as it is shared between requests.
+    """
+    y_gradient = np.linspace(0, 40, height).reshape(-1, 1)
+    x_gradient = np.linspace(0, 30, width).reshape(1, -1)
+    gradient = (y_gradient + x_gradient).astype(np.int16)[:, :, np.newaxis]
+    gradient.setflags(write=False)
+    return gradient
+
+
+@lru_cache(maxsize=8)
+def _dither(height: int, width: int) -> np.ndarray:
+    """
+    (height, width, 3) int16 noise in [-20, 20) added to images that encode too small -
+    a fixed pattern built once per tile size instead of fresh random numbers per request.
+    """
+    noise = np.random.default_rng(0).integers(-20, 20, size=(height, width, 3), dtype=np.int16)
+    noise.setflags(write=False)
+    return noise
+
+
+def _normalize_uint8(image: np.ndarray, min_val, max_val) -> np.ndarray:
+    """
+    Stretch a uint8 image's [min_val, max_val] to [0, 255] in one pass through a 256-entry
+    lookup table - no image-sized float temporaries.
+    """
+    levels = np.arange(256, dtype=np.float32)
+    levels -= min_val
+    levels /= max(int(max_val) - int(min_val), 1)
+    levels *= 255
+    return _to_uint8(levels)[image]
+
+
 @router.get("/image")
 async def get_satellite_image(
     lat: float = Query(..., description="Latitude"),
@@ -32,177 +274,239 @@ async def get_satellite_image(
         
         # Ensure valid uint8 range
         if rgb_image.dtype != np.uint8:
-            rgb_image = np.clip(rgb_image, 0, 255).astype(np.uint8)
+            rgb_image = _to_uint8(rgb_image)
         
         # Ensure image has visible content - enhance if needed
-        if rgb_image.max() - rgb_image.min() < 20:
+        min_val, max_val = rgb_image.min(), rgb_image.max()
+        if max_val - min_val < 20:
             logger.warning("Image has low contrast, enhancing...")
             # Enhance contrast and add variation
             h, w = rgb_image.shape[:2]
             # Add gradient for visibility
-            y_gradient = np.linspace(0, 40, h).reshape(-1, 1)
-            x_gradient = np.linspace(0, 30, w).reshape(1, -1)
-            gradient = y_gradient + x_gradient
-            rgb_image = np.clip(rgb_image.astype(np.int16) + gradient.astype(np.int16), 0, 255).astype(np.uint8)
+            enhanced = rgb_image.astype(np.int16)
+            enhanced += _visibility_gradient(h, w)
+            rgb_image = _to_uint8(enhanced)
             
             # Enhance contrast
             min_val, max_val = rgb_image.min(), rgb_image.max()
             if max_val - min_val > 5:
-                rgb_image = ((rgb_image.astype(np.float32) - min_val) / (max_val - min_val) * 255).astype(np.uint8)
-        
-        # Convert to PIL Image
-        img = Image.fromarray(rgb_image, mode='RGB')
+                rgb_image = _normalize_uint8(rgb_image, min_val, max_val)
         
         # Convert to requested format
         if format == "base64":
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG", optimize=False)
-            img_bytes = buffer.getvalue()
-            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+            img_base64 = _b64encode(_encode_png(rgb_image))
             return {
                 "image": f"data:image/png;base64,{img_base64}",
                 "format": "base64",
                 "size": {"width": int(rgb_image.shape[1]), "height": int(rgb_image.shape[0])}
             }
+        elif format == "png":
+            return Response(content=_encode_png(rgb_image), media_type="image/png")
         else:
             buffer = io.BytesIO()
-            img.save(buffer, format=format.upper(), optimize=False)
+            Image.fromarray(rgb_image, mode='RGB').save(buffer, format=format.upper(), optimize=False)
             return Response(content=buffer.getvalue(), media_type=f"image/{format}")
     
     except Exception as e:
-        import traceback
         raise HTTPException(status_code=500, detail=f"Failed to fetch satellite image: {str(e)}\n{traceback.format_exc()}")
 
+async def _detect_clouds(lat: float, lon: float, radius_km: float):
+    """Latest satellite image around the location and its cloud mask (ML detector, else brightness threshold)"""
+    logger.info(f"Fetching satellite image for lat={lat}, lon={lon}, radius={radius_km}")
+    
+    # Fetch satellite image
+    logger.info("Fetching satellite image from ingester...")
+    image_array = await satellite_ingester.fetch_latest_image(lat, lon, radius_km)
+    
+    # Ensure we have a valid image
+    if image_array is None or image_array.size == 0:
+        raise ValueError("Failed to fetch satellite image - received empty array")
+    logger.info(f"Received image array shape: {image_array.shape}, dtype: {image_array.dtype}, min: {image_array.min()}, max: {image_array.max()}")
+    
+    # Try to run cloud detection, fallback to simple threshold if ML not available
+    try:
+        logger.info("Running cloud detection with ML model...")
+        predictor = _get_predictor()
+        if predictor.cloud_detector:
+            cloud_mask = predictor.cloud_detector.predict(image_array)
+            logger.info(f"Cloud mask shape: {cloud_mask.shape}")
+        else:
+            raise Exception("Cloud detector not available")
+    except Exception as ml_error:
+        logger.warning(f"ML cloud detection failed, using simple threshold: {ml_error}")
+        # Simple cloud detection based on brightness
+        cloud_mask = _threshold_cloud_mask(image_array)
+    
+    return image_array, cloud_mask
+
+
+def _render_overlay(image_array: np.ndarray, cloud_mask: np.ndarray, hq: bool):
+    """PNG bytes of the image with the cloud mask blended over it, and the image size"""
+    # Create overlay visualization
+    # (a view - the image is only read from here on)
+    rgb_image = image_array[:, :, :3]
+    
+    # Ensure RGB image is valid uint8
+    if rgb_image.dtype != np.uint8:
+        rgb_image = _to_uint8(rgb_image)
+    
+    min_val, max_val = rgb_image.min(), rgb_image.max()
+    logger.info(f"RGB image shape: {rgb_image.shape}, dtype: {rgb_image.dtype}, min: {min_val}, max: {max_val}, mean: {rgb_image.mean():.1f}")
+    
+    # Ensure image has good contrast
+    if max_val - min_val < 30:
+        logger.warning("Image has low contrast, enhancing...")
+        # Enhance contrast
+        if max_val - min_val > 5:
+            rgb_image = _normalize_uint8(rgb_image, min_val, max_val)
+            logger.info(f"Enhanced image - stretched [{min_val}, {max_val}] to [0, 255]")
+    
+    # Overlay cloud mask with transparency - the precomputed keep factor and tint of each
+    # pixel's cloud class applied in place to a single float copy of the image
+    overlay = rgb_image.astype(np.float32)
+    overlay *= CLOUD_KEEP_TABLE[cloud_mask][..., np.newaxis]
+    overlay += CLOUD_TINT_TABLE[cloud_mask]
+    
+    # Convert back to uint8
+    overlay_uint8 = _to_uint8(overlay)
+    
+    # Save image
+    img_bytes = _encode_overlay(overlay_uint8, hq)
+    
+    if len(img_bytes) < 1000:
+        logger.warning(f"Image too small ({len(img_bytes)} bytes), regenerating with more variation...")
+        # Add more variation to make image visible
+        varied = overlay_uint8.astype(np.int16)
+        varied += _dither(*overlay_uint8.shape[:2])
+        overlay_uint8 = _to_uint8(varied)
+        img_bytes = _encode_overlay(overlay_uint8, hq)
+    
+    logger.info(f"Satellite image processing complete. Image size: {len(img_bytes)} bytes")
+    
+    if len(img_bytes) < 5000:
+        logger.warning(f"Image still very small ({len(img_bytes)} bytes) - may not display correctly")
+    
+    return img_bytes, {"width": int(rgb_image.shape[1]), "height": int(rgb_image.shape[0])}
+
+
+def _check_mask_format(mask_format: str):
+    """400 for a mask_format other than base64, png or json"""
+    if mask_format not in MASK_FORMATS:
+        raise HTTPException(status_code=400, detail="mask_format must be 'base64', 'png' or 'json'")
+
+
+def _json_mask(cloud_mask: np.ndarray, mask_format: str):
+    """The cloud mask for a JSON response - base64 bytes, a base64 PNG or nested lists"""
+    if mask_format == "json":
+        return cloud_mask.tolist()
+    if mask_format == "png":
+        return _encode_mask_png(cloud_mask)
+    return _encode_mask(cloud_mask)
+
+
+def _processing_error(e: Exception) -> HTTPException:
+    """500 for a failure while fetching or processing the satellite image"""
+    error_detail = f"Failed to process satellite image: {str(e)}\n{traceback.format_exc()}"
+    print(error_detail)
+    return HTTPException(status_code=500, detail=error_detail)
+
+
 @router.get("/image/with-clouds")
 async def get_satellite_image_with_clouds(
+    request: Request,
     lat: float = Query(..., description="Latitude"),
     lon: float = Query(..., description="Longitude"),
-    radius_km: float = Query(50, description="Radius in kilometers")
+    radius_km: float = Query(50, description="Radius in kilometers"),
+    mask_format: str = Query("base64", description="Cloud mask format (base64, png, json)"),
+    mask_scale: int = Query(1, ge=1, le=MAX_MASK_SCALE, description="Downsample the cloud mask by this factor"),
+    hq: bool = Query(False, description="Full-color image at higher compression instead of a palette image")
 ):
     """
     Fetch satellite image with cloud detection overlay.
     Returns base64 encoded image with cloud mask overlay.
+    
+    The cloud mask comes as {"data", "shape", "dtype"} with the uint8 pixels base64 encoded -
+    decode with np.frombuffer(base64.b64decode(data), np.uint8).reshape(shape).
+    mask_format=png sends it as a base64 2-bit palette PNG ("encoding": "png") and
+    mask_format=json as nested lists instead. mask_scale=n shrinks the mask n times in each
+    direction, keeping the densest cloud class of every n x n block.
+    With Accept: application/msgpack the response is msgpack, with the mask's raw bytes in "data".
+    The overlay is a palette image unless hq is set.
+    
+    Clients that can composite two layers should prefer /image/with-clouds.png and
+    /image/with-clouds/mask - the PNG is then sent as-is, without base64.
     """
+    _check_mask_format(mask_format)
+    
     try:
-        import logging
-        logger = logging.getLogger(__name__)
+        image_array, cloud_mask = await _detect_clouds(lat, lon, radius_km)
+        img_bytes, size = _render_overlay(image_array, cloud_mask, hq)
+        image = f"data:image/png;base64,{_b64encode(img_bytes)}"
+        cloud_mask = _downsample_mask(cloud_mask, mask_scale)
         
-        logger.info(f"Fetching satellite image for lat={lat}, lon={lon}, radius={radius_km}")
-        
-        # Fetch satellite image
-        logger.info("Fetching satellite image from ingester...")
-        image_array = await satellite_ingester.fetch_latest_image(lat, lon, radius_km)
-        logger.info(f"Received image array shape: {image_array.shape}, dtype: {image_array.dtype}, min: {image_array.min()}, max: {image_array.max()}")
-        
-        # Ensure we have a valid image
-        if image_array is None or image_array.size == 0:
-            raise ValueError("Failed to fetch satellite image - received empty array")
-        
-        # Try to run cloud detection, fallback to simple threshold if ML not available
-        try:
-            from app.services.irradiance_predictor import IrradiancePredictor
-            logger.info("Running cloud detection with ML model...")
-            predictor = IrradiancePredictor()
-            if predictor.cloud_detector:
-                cloud_mask = predictor.cloud_detector.predict(image_array)
-                logger.info(f"Cloud mask shape: {cloud_mask.shape}")
-            else:
-                raise Exception("Cloud detector not available")
-        except Exception as ml_error:
-            logger.warning(f"ML cloud detection failed, using simple threshold: {ml_error}")
-            # Simple cloud detection based on brightness
-            gray = np.mean(image_array[:, :, :3], axis=2)
-            cloud_mask = np.zeros_like(gray, dtype=np.uint8)
-            cloud_mask[gray > 200] = 1  # Thin clouds
-            cloud_mask[gray > 220] = 2  # Thick clouds
-            cloud_mask[gray > 240] = 3  # Storm
-        
-        # Create overlay visualization
-        rgb_image = image_array[:, :, :3].copy()
-        
-        # Ensure RGB image is valid uint8
-        if rgb_image.dtype != np.uint8:
-            rgb_image = np.clip(rgb_image, 0, 255).astype(np.uint8)
-        
-        logger.info(f"RGB image shape: {rgb_image.shape}, dtype: {rgb_image.dtype}, min: {rgb_image.min()}, max: {rgb_image.max()}, mean: {rgb_image.mean():.1f}")
-        
-        # Ensure image has good contrast
-        if rgb_image.max() - rgb_image.min() < 30:
-            logger.warning("Image has low contrast, enhancing...")
-            # Enhance contrast
-            min_val, max_val = rgb_image.min(), rgb_image.max()
-            if max_val - min_val > 5:
-                rgb_image = ((rgb_image.astype(np.float32) - min_val) / (max_val - min_val) * 255).astype(np.uint8)
-                logger.info(f"Enhanced image - new range: [{rgb_image.min()}, {rgb_image.max()}]")
-        
-        # Overlay cloud mask with transparency
-        overlay = rgb_image.copy().astype(np.float32)  # Use float for blending
-        
-        # Color code clouds: clear=transparent, thin=light blue, thick=gray, storm=dark gray
-        cloud_colors = {
-            0: [0, 0, 0, 0],      # Clear - transparent
-            1: [135, 206, 235, 100],  # Thin clouds - light blue
-            2: [128, 128, 128, 150],  # Thick clouds - gray
-            3: [64, 64, 64, 200]     # Storm - dark gray
+        if _accepts_msgpack(request):
+            return Response(
+                content=msgpack.packb({
+                    "image": image,
+                    "cloud_mask": _pack_mask(cloud_mask),
+                    "size": size
+                }, use_bin_type=True),
+                media_type=MSGPACK_MEDIA_TYPE
+            )
+        return {
+            "image": image,
+            "cloud_mask": _json_mask(cloud_mask, mask_format),
+            "size": size
         }
-        
-        # Apply cloud overlay more efficiently
-        for cloud_type in [1, 2, 3]:
-            mask = cloud_mask == cloud_type
-            if np.any(mask):
-                color = cloud_colors.get(cloud_type, [128, 128, 128, 150])
-                alpha = color[3] / 255.0
-                overlay[mask, 0] = rgb_image[mask, 0] * (1 - alpha) + color[0] * alpha
-                overlay[mask, 1] = rgb_image[mask, 1] * (1 - alpha) + color[1] * alpha
-                overlay[mask, 2] = rgb_image[mask, 2] * (1 - alpha) + color[2] * alpha
-        
-        # Convert back to uint8
-        overlay = np.clip(overlay, 0, 255).astype(np.uint8)
-        
-        # Convert to base64
-        logger.info("Converting image to base64...")
-        try:
-            # Ensure overlay is uint8 and has valid range
-            overlay_uint8 = np.clip(overlay, 0, 255).astype(np.uint8)
-            
-            # Create PIL Image
-            img = Image.fromarray(overlay_uint8, mode='RGB')
-            
-            # Save image
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            img_bytes = buffer.getvalue()
-            
-            if len(img_bytes) < 1000:
-                logger.warning(f"Image too small ({len(img_bytes)} bytes), regenerating with more variation...")
-                # Add more variation to make image visible
-                variation = np.random.randint(-20, 20, overlay_uint8.shape).astype(np.int16)
-                overlay_uint8 = np.clip(overlay_uint8.astype(np.int16) + variation, 0, 255).astype(np.uint8)
-                img = Image.fromarray(overlay_uint8, mode='RGB')
-                buffer = io.BytesIO()
-                img.save(buffer, format="PNG", optimize=False)
-                img_bytes = buffer.getvalue()
-            
-            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-            
-            logger.info(f"Satellite image processing complete. Image size: {len(img_bytes)} bytes, Base64 length: {len(img_base64)}")
-            
-            if len(img_bytes) < 5000:
-                logger.warning(f"Image still very small ({len(img_bytes)} bytes) - may not display correctly")
-            
-            return {
-                "image": f"data:image/png;base64,{img_base64}",
-                "cloud_mask": cloud_mask.tolist(),
-                "size": {"width": int(rgb_image.shape[1]), "height": int(rgb_image.shape[0])}
-            }
-        except Exception as img_error:
-            import traceback
-            logger.error(f"Error converting image: {img_error}\n{traceback.format_exc()}")
-            raise
     
     except Exception as e:
-        import traceback
-        error_detail = f"Failed to process satellite image: {str(e)}\n{traceback.format_exc()}"
-        print(error_detail)
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise _processing_error(e)
 
+
+@router.get("/image/with-clouds.png")
+async def get_satellite_overlay_png(
+    lat: float = Query(..., description="Latitude"),
+    lon: float = Query(..., description="Longitude"),
+    radius_km: float = Query(50, description="Radius in kilometers"),
+    hq: bool = Query(False, description="Full-color image at higher compression instead of a palette image")
+):
+    """
+    Satellite image with the cloud overlay as a plain PNG response (no base64 or JSON) -
+    usable directly as an <img> src. The image size comes from the PNG itself.
+    """
+    try:
+        image_array, cloud_mask = await _detect_clouds(lat, lon, radius_km)
+        img_bytes, _ = _render_overlay(image_array, cloud_mask, hq)
+        return Response(content=img_bytes, media_type="image/png")
+    except Exception as e:
+        raise _processing_error(e)
+
+
+@router.get("/image/with-clouds/mask")
+async def get_satellite_cloud_mask(
+    request: Request,
+    lat: float = Query(..., description="Latitude"),
+    lon: float = Query(..., description="Longitude"),
+    radius_km: float = Query(50, description="Radius in kilometers"),
+    mask_format: str = Query("base64", description="Cloud mask format (base64, png, json)"),
+    mask_scale: int = Query(1, ge=1, le=MAX_MASK_SCALE, description="Downsample the cloud mask by this factor")
+):
+    """
+    Only the cloud mask of the latest satellite image, in the same formats as /image/with-clouds
+    (msgpack with Accept: application/msgpack). No overlay image is rendered.
+    """
+    _check_mask_format(mask_format)
+    
+    try:
+        image_array, cloud_mask = await _detect_clouds(lat, lon, radius_km)
+        cloud_mask = _downsample_mask(cloud_mask, mask_scale)
+        size = {"width": int(image_array.shape[1]), "height": int(image_array.shape[0])}
+        
+        if _accepts_msgpack(request):
+            return Response(
+                content=msgpack.packb({"cloud_mask": _pack_mask(cloud_mask), "size": size}, use_bin_type=True),
+                media_type=MSGPACK_MEDIA_TYPE
+            )
+        return {"cloud_mask": _json_mask(cloud_mask, mask_format), "size": size}
+    except Exception as e:
+        raise _processing_error(e)
@@ -3,11 +3,12 @@ Schedule Management API endpoints
 Handles schedule generation and retrieval.
 """
 from fastapi import APIRouter, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional
 from datetime import datetime, date
 
-from app.core.database import get_db
+from app.core.database import get_db, dialect_insert
+from app.api.v1.microgrid import DEFAULT_CONFIGURATION
 from app.models.database import Schedule, Microgrid, Device, SystemConfiguration
 from app.models.schemas import (
     ScheduleResponse,
@@ -15,13 +16,78 @@ from app.models.schemas import (
     OptimizationMetrics
 )
 from app.services.scheduler_engine import SchedulerEngine
+import asyncio
 import logging
+import numpy as np
 from dateutil import parser
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# The scheduler works in 10-minute slots - each hourly forecast point covers six of them
+SLOT_OFFSETS = np.arange(0, 60, 10, dtype='timedelta64[m]')
+SLOTS_PER_POINT = len(SLOT_OFFSETS)
+
+
+def _parse_forecast_time(value: str) -> datetime:
+    """
+    Forecast point timestamp. Forecasts carry ISO 8601 timestamps, which fromisoformat
+    parses directly ('Z' included) - dateutil's general parser only for anything else.
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parser.parse(value)
+
+
+def _slot_timestamps(point_times: List[datetime]) -> List[str]:
+    """
+    ISO timestamps of the slots of every point, in order, computed in one NumPy pass.
+    Formatted like datetime.isoformat(), including the UTC offset of aware times.
+    """
+    naive_times = [t.replace(tzinfo=None) for t in point_times]
+    slot_times = (np.array(naive_times, dtype='datetime64[us]')[:, np.newaxis] + SLOT_OFFSETS).reshape(-1)
+    # isoformat() leaves out zero microseconds. Slot offsets are whole minutes, so each slot
+    # has its point's microseconds - the '.ffffff' is dropped again for whole-second points.
+    has_microseconds = [t.microsecond != 0 for t in naive_times]
+    unit = 'us' if any(has_microseconds) else 's'
+    timestamps = np.datetime_as_string(slot_times, unit=unit).tolist()
+    
+    offsets = [
+        t.isoformat()[len(naive.isoformat()):] if t.tzinfo is not None else ''
+        for t, naive in zip(point_times, naive_times)
+    ]
+    trim = [unit == 'us' and not us for us in has_microseconds]
+    if any(offsets) or any(trim):
+        timestamps = [
+            (ts[:-7] if trim[i // SLOTS_PER_POINT] else ts) + offsets[i // SLOTS_PER_POINT]
+            for i, ts in enumerate(timestamps)
+        ]
+    return timestamps
+
+
+def _ten_minute_slots(points: List[tuple]) -> List[dict]:
+    """
+    The scheduler slots of hourly forecast points, given as
+    (point_time, power_kw, ghi, solar_elevation, is_daytime). The power and GHI dicts
+    are shared by the six slots of a point - the scheduler only reads them.
+    """
+    timestamps = _slot_timestamps([point[0] for point in points])
+    return [
+        {
+            'timestamp': timestamp,
+            'power_kw': power_kw,
+            'ghi': ghi,
+            'solar_elevation': solar_elevation,
+            'is_daytime': is_daytime
+        }
+        for timestamp, (_, power_kw, ghi, solar_elevation, is_daytime) in zip(
+            timestamps,
+            (point for point in points for _ in range(SLOTS_PER_POINT))
+        )
+    ]
+
 
 @router.post("/microgrid/{microgrid_id}/schedules/generate", response_model=ScheduleResponse, status_code=201)
 async def generate_schedule(
@@ -30,44 +96,27 @@ async def generate_schedule(
     db: Session = Depends(get_db)
 ):
     """Generate an optimized schedule for a microgrid."""
-    # Verify microgrid exists
-    microgrid = db.query(Microgrid).filter(Microgrid.id == microgrid_id).first()
+    # Verify microgrid exists - its configuration joined in, active devices in one follow-up SELECT
+    microgrid = db.query(Microgrid).options(
+        joinedload(Microgrid.configuration),
+        selectinload(Microgrid.devices.and_(Device.is_active == True))
+    ).filter(Microgrid.id == microgrid_id).first()
     if not microgrid:
         raise HTTPException(status_code=404, detail=f"Microgrid {microgrid_id} not found")
     
     # Get system configuration
-    config = db.query(SystemConfiguration).filter(
-        SystemConfiguration.microgrid_id == microgrid_id
-    ).first()
+    config = microgrid.configuration
     
     if not config:
-        # Create default configuration
+        # Create default configuration (committed together with the schedule)
         config = SystemConfiguration(
             microgrid_id=microgrid_id,
-            battery_capacity_kwh=50.0,
-            battery_max_charge_rate_kw=10.0,
-            battery_max_discharge_rate_kw=10.0,
-            battery_efficiency=0.95,
-            battery_min_soc=0.2,
-            battery_max_soc=0.95,
-            grid_peak_rate_per_kwh=10.0,
-            grid_off_peak_rate_per_kwh=5.0,
-            grid_peak_hours={'start': 8, 'end': 20},
-            generator_fuel_consumption_l_per_kwh=0.25,
-            generator_fuel_cost_per_liter=80.0,
-            generator_min_runtime_minutes=30,
-            generator_max_power_kw=20.0,
-            optimization_mode=request.optimization_mode or 'cost',
-            safety_margin_critical_loads=0.1
+            **{**DEFAULT_CONFIGURATION, 'optimization_mode': request.optimization_mode or 'cost'}
         )
         db.add(config)
-        db.commit()
     
     # Get devices
-    devices = db.query(Device).filter(
-        Device.microgrid_id == microgrid_id,
-        Device.is_active == True
-    ).all()
+    devices = microgrid.devices
     
     if not devices:
         raise HTTPException(
@@ -113,17 +162,12 @@ async def generate_schedule(
                     raise ValueError("Forecast API returned empty forecast data")
                 
                 # Convert hourly forecast to 10-minute intervals for scheduler
-                from datetime import timedelta
+                hourly_points = []
                 for point in forecast_points:
                     # Parse timestamp - handle both string and datetime objects
                     point_timestamp = point.get('timestamp')
                     if isinstance(point_timestamp, str):
-                        # Try parsing ISO format
-                        try:
-                            point_time = datetime.fromisoformat(point_timestamp.replace('Z', '+00:00'))
-                        except:
-                            # Try parsing other formats
-                            point_time = parser.parse(point_timestamp)
+                        point_time = _parse_forecast_time(point_timestamp)
                     elif isinstance(point_timestamp, datetime):
                         point_time = point_timestamp
                     else:
@@ -154,24 +198,16 @@ async def generate_schedule(
                     solar_elevation = point.get('solar_elevation', 0)
                     is_daytime = point.get('is_daytime', False)
                     
-                    # Create 6 time slots for this hour (10-minute intervals)
-                    for minute_offset in [0, 10, 20, 30, 40, 50]:
-                        slot_time = point_time + timedelta(minutes=minute_offset)
-                        forecast_data.append({
-                            'timestamp': slot_time.isoformat(),
-                            'power_kw': {
-                                'mean': power_mean,
-                                'p10': power_p10,
-                                'p90': power_p90
-                            },
-                            'ghi': {
-                                'mean': ghi_mean,
-                                'p10': ghi_p10,
-                                'p90': ghi_p90
-                            },
-                            'solar_elevation': solar_elevation,
-                            'is_daytime': is_daytime
-                        })
+                    hourly_points.append((
+                        point_time,
+                        {'mean': power_mean, 'p10': power_p10, 'p90': power_p90},
+                        {'mean': ghi_mean, 'p10': ghi_p10, 'p90': ghi_p90},
+                        solar_elevation,
+                        is_daytime
+                    ))
+                
+                # Create 6 time slots for each hour (10-minute intervals)
+                forecast_data.extend(_ten_minute_slots(hourly_points))
                 
                 logger.info(f"Successfully fetched {len(forecast_points)} hourly forecast points, expanded to {len(forecast_data)} 10-minute intervals")
             else:
@@ -194,34 +230,24 @@ async def generate_schedule(
                 )
                 
                 # Expand hourly to 10-minute intervals
-                from datetime import timedelta
                 forecast_points = internal_forecast.get('forecast', [])
+                hourly_points = []
                 for point in forecast_points:
                     # Each hourly point becomes 6 x 10-minute intervals
-                    base_timestamp = datetime.fromisoformat(point['timestamp'].replace('Z', '+00:00'))
+                    base_timestamp = _parse_forecast_time(point['timestamp'])
                     if base_timestamp.tzinfo:
                         base_timestamp = base_timestamp.replace(tzinfo=None)
                     
-                    for interval in range(6):
-                        timestamp = base_timestamp + timedelta(minutes=interval * 10)
-                        power_mean = point.get('power_kw', {}).get('mean', 0) / 6.0  # Distribute hourly power
-                        ghi_mean = point.get('ghi', {}).get('mean', 0) / 6.0
-                        
-                        forecast_data.append({
-                            'timestamp': timestamp.isoformat(),
-                            'power_kw': {
-                                'mean': power_mean,
-                                'p10': power_mean * 0.8,
-                                'p90': power_mean * 1.2
-                            },
-                            'ghi': {
-                                'mean': ghi_mean,
-                                'p10': ghi_mean * 0.8,
-                                'p90': ghi_mean * 1.2
-                            },
-                            'solar_elevation': point.get('solar_elevation', 0),
-                            'is_daytime': point.get('is_daytime', False)
-                        })
+                    power_mean = point.get('power_kw', {}).get('mean', 0) / 6.0  # Distribute hourly power
+                    ghi_mean = point.get('ghi', {}).get('mean', 0) / 6.0
+                    hourly_points.append((
+                        base_timestamp,
+                        {'mean': power_mean, 'p10': power_mean * 0.8, 'p90': power_mean * 1.2},
+                        {'mean': ghi_mean, 'p10': ghi_mean * 0.8, 'p90': ghi_mean * 1.2},
+                        point.get('solar_elevation', 0),
+                        point.get('is_daytime', False)
+                    ))
+                forecast_data.extend(_ten_minute_slots(hourly_points))
                 
                 logger.info(f"Successfully used internal forecast: {len(forecast_data)} points")
             except Exception as internal_error:
@@ -244,25 +270,23 @@ async def generate_schedule(
             )
             
             # Expand hourly to 10-minute intervals
-            from datetime import timedelta
             forecast_points = internal_forecast.get('forecast', [])
+            hourly_points = []
             for point in forecast_points:
-                base_timestamp = datetime.fromisoformat(point['timestamp'].replace('Z', '+00:00'))
+                base_timestamp = _parse_forecast_time(point['timestamp'])
                 if base_timestamp.tzinfo:
                     base_timestamp = base_timestamp.replace(tzinfo=None)
                 
-                for interval in range(6):
-                    timestamp = base_timestamp + timedelta(minutes=interval * 10)
-                    power_mean = point.get('power_kw', {}).get('mean', 0) / 6.0
-                    ghi_mean = point.get('ghi', {}).get('mean', 0) / 6.0
-                    
-                    forecast_data.append({
-                        'timestamp': timestamp.isoformat(),
-                        'power_kw': {'mean': power_mean},
-                        'ghi': {'mean': ghi_mean},
-                        'solar_elevation': point.get('solar_elevation', 0),
-                        'is_daytime': point.get('is_daytime', False)
-                    })
+                power_mean = point.get('power_kw', {}).get('mean', 0) / 6.0
+                ghi_mean = point.get('ghi', {}).get('mean', 0) / 6.0
+                hourly_points.append((
+                    base_timestamp,
+                    {'mean': power_mean},
+                    {'mean': ghi_mean},
+                    point.get('solar_elevation', 0),
+                    point.get('is_daytime', False)
+                ))
+            forecast_data.extend(_ten_minute_slots(hourly_points))
             
             logger.info(f"Generated forecast from internal model: {len(forecast_data)} points")
         except Exception as forecast_error:
@@ -291,8 +315,8 @@ async def generate_schedule(
     try:
         from app.models.database import SensorReading
         
-        # Get latest sensor reading for battery state
-        latest_reading = db.query(SensorReading).filter(
+        # Get latest sensor reading for battery state (only its power output is used)
+        latest_reading = db.query(SensorReading.power_output).filter(
             SensorReading.microgrid_id == microgrid_id
         ).order_by(SensorReading.timestamp.desc()).first()
         
@@ -342,13 +366,16 @@ async def generate_schedule(
         'safety_margin_critical_loads': config.safety_margin_critical_loads
     }
     
-    # Generate schedule
+    # Generate schedule - CPU-bound, so in a worker thread to keep the event loop serving other requests
     scheduler = SchedulerEngine(config_dict)
-    schedule_result = scheduler.generate_schedule(
-        forecast_data=forecast_data,
-        devices=devices_dict,
-        initial_battery_soc=initial_soc,
-        time_slot_minutes=10
+    schedule_result = await asyncio.get_running_loop().run_in_executor(
+        None,
+        lambda: scheduler.generate_schedule(
+            forecast_data=forecast_data,
+            devices=devices_dict,
+            initial_battery_soc=initial_soc,
+            time_slot_minutes=10
+        )
     )
     
     # Determine schedule date
@@ -366,34 +393,27 @@ async def generate_schedule(
     else:
         schedule_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Check if schedule already exists for this date
-    existing_schedule = db.query(Schedule).filter(
-        Schedule.microgrid_id == microgrid_id,
-        Schedule.date == schedule_date
-    ).first()
+    # Create the schedule, or replace the one already generated for this date, in one statement
+    upsert = dialect_insert(db.get_bind())(Schedule).values(
+        microgrid_id=microgrid_id,
+        date=schedule_date,
+        schedule_data=schedule_result,
+        optimization_metrics=schedule_result.get('metrics', {}),
+        is_active=True
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=['microgrid_id', 'date'],
+        set_={
+            'schedule_data': upsert.excluded.schedule_data,
+            'optimization_metrics': upsert.excluded.optimization_metrics,
+            'is_active': True,
+            'updated_at': datetime.utcnow()
+        }
+    ).returning(*Schedule.__table__.columns)
     
-    if existing_schedule:
-        # Update existing schedule
-        existing_schedule.schedule_data = schedule_result
-        existing_schedule.optimization_metrics = schedule_result.get('metrics', {})
-        existing_schedule.is_active = True
-        existing_schedule.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(existing_schedule)
-        return existing_schedule
-    else:
-        # Create new schedule
-        db_schedule = Schedule(
-            microgrid_id=microgrid_id,
-            date=schedule_date,
-            schedule_data=schedule_result,
-            optimization_metrics=schedule_result.get('metrics', {}),
-            is_active=True
-        )
-        db.add(db_schedule)
-        db.commit()
-        db.refresh(db_schedule)
-        return db_schedule
+    schedule = db.execute(upsert).one()
+    db.commit()
+    return schedule._asdict()
 
 
 @router.get("/microgrid/{microgrid_id}/schedules", response_model=List[ScheduleResponse])
@@ -1,71 +1,119 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.models.schemas import SensorReadingRequest, SensorReadingResponse
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import select, insert, lambda_stmt, func, cast, text, table, column, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
+from app.core.cache import cache_get, cache_set, latest_reading_key
+from app.models.schemas import SensorReadingRequest, SensorReadingResponse, SensorReadingBucketResponse
 from app.models.database import SensorReading
-from typing import List
-from datetime import datetime
+from app.services.sensor_buffer import sensor_buffer
+from app.services.sensor_rollups import epoch_seconds
+from typing import List, Optional
+from datetime import datetime, timedelta
+import orjson
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# The latest reading is written through on every ingest - the TTL is only a safety net
+LATEST_READING_CACHE_TTL_SECONDS = 3600
+
+# Bucket sizes of /history/buckets (per-bucket averages instead of raw readings)
+HISTORY_BUCKET_MINUTES = (5, 15, 60)
+
+# On TimescaleDB the buckets come from this continuous aggregate (scripts/setup_timescaledb.py),
+# so a day of history reads a few hundred pre-aggregated rows; elsewhere the raw readings are grouped
+_aggregate = table(
+    'sensor_readings_5min',
+    column('microgrid_id'), column('bucket'),
+    column('irradiance_sum'), column('power_output_sum'), column('temperature_sum'),
+    column('humidity_sum'), column('wind_speed_sum'), column('wind_speed_readings'), column('readings'),
+)
+_has_aggregate: Optional[bool] = None
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Reads fetch plain rows of the response columns - no ORM objects or identity-map bookkeeping per reading
+_READING_COLUMNS = (
+    SensorReading.id,
+    SensorReading.microgrid_id,
+    SensorReading.timestamp,
+    SensorReading.irradiance,
+    SensorReading.power_output,
+    SensorReading.temperature,
+    SensorReading.humidity,
+    SensorReading.wind_speed,
+    SensorReading.wind_direction
+)
+
+
+def _recent_readings(microgrid_id: str, limit: int):
+    """A microgrid's newest readings. As a lambda statement the SQL is compiled once per
+    process and cached - later calls only bind microgrid_id and limit."""
+    return lambda_stmt(lambda: select(*_READING_COLUMNS).where(
+        SensorReading.microgrid_id == microgrid_id
+    ).order_by(SensorReading.timestamp.desc()).limit(limit))
+
+# Built once - each ingest only binds its row's values to the same cached statement
+_INSERT_READING = insert(SensorReading).returning(*_READING_COLUMNS)
+
 @router.post("/reading", response_model=SensorReadingResponse)
-async def ingest_sensor_reading(reading: SensorReadingRequest, db: Session = Depends(get_db)):
+async def ingest_sensor_reading(reading: SensorReadingRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Ingest sensor data from microgrid.
+    With SENSOR_INGEST_BUFFERED the reading is queued for a batch insert and the
+    response is 202 Accepted, without an id.
     """
-    sensor_reading = SensorReading(
-        microgrid_id=reading.microgrid_id,
-        timestamp=datetime.utcnow(),
-        irradiance=reading.irradiance,
-        power_output=reading.power_output,
-        temperature=reading.temperature,
-        humidity=reading.humidity,
-        wind_speed=reading.wind_speed,
-        wind_direction=reading.wind_direction
-    )
+    row = {
+        'microgrid_id': reading.microgrid_id,
+        'timestamp': datetime.utcnow(),
+        'irradiance': reading.irradiance,
+        'power_output': reading.power_output,
+        'temperature': reading.temperature,
+        'humidity': reading.humidity,
+        'wind_speed': reading.wind_speed,
+        'wind_direction': reading.wind_direction
+    }
     
-    db.add(sensor_reading)
-    db.commit()
-    db.refresh(sensor_reading)
+    if sensor_buffer.running:
+        await sensor_buffer.put(row)
+        return ORJSONResponse(status_code=202, content=row)
     
-    return SensorReadingResponse(
-        id=sensor_reading.id,
-        microgrid_id=sensor_reading.microgrid_id,
-        timestamp=sensor_reading.timestamp,
-        irradiance=sensor_reading.irradiance,
-        power_output=sensor_reading.power_output,
-        temperature=sensor_reading.temperature,
-        humidity=sensor_reading.humidity,
-        wind_speed=sensor_reading.wind_speed,
-        wind_direction=sensor_reading.wind_direction
+    # INSERT ... RETURNING - the stored row comes back without a refresh query
+    sensor_reading = (await db.execute(_INSERT_READING, row)).one()
+    await db.commit()
+    
+    response = SensorReadingResponse.model_validate(sensor_reading)
+    await _cache_latest(response)
+    return response
+
+async def _cache_latest(reading: SensorReadingResponse):
+    """Write a microgrid's latest reading through to Redis, serialized as the response body"""
+    await cache_set(
+        latest_reading_key(reading.microgrid_id),
+        orjson.dumps(reading.model_dump()),
+        ttl_seconds=LATEST_READING_CACHE_TTL_SECONDS
     )
 
 @router.get("/{microgrid_id}/latest", response_model=SensorReadingResponse)
-async def get_latest_reading(microgrid_id: str, db: Session = Depends(get_db)):
+async def get_latest_reading(microgrid_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Get latest sensor reading for a microgrid.
     """
+    cached = await cache_get(latest_reading_key(microgrid_id))
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
     try:
-        reading = db.query(SensorReading).filter(
-            SensorReading.microgrid_id == microgrid_id
-        ).order_by(SensorReading.timestamp.desc()).first()
+        reading = (await db.execute(_recent_readings(microgrid_id, 1))).first()
         
         if not reading:
             raise HTTPException(status_code=404, detail=f"No sensor readings found for microgrid {microgrid_id}")
         
-        return SensorReadingResponse(
-            id=reading.id,
-            microgrid_id=reading.microgrid_id,
-            timestamp=reading.timestamp,
-            irradiance=reading.irradiance,
-            power_output=reading.power_output,
-            temperature=reading.temperature,
-            humidity=reading.humidity,
-            wind_speed=reading.wind_speed,
-            wind_direction=reading.wind_direction
-        )
+        response = SensorReadingResponse.model_validate(reading)
+        await _cache_latest(response)
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -73,30 +121,99 @@ async def get_latest_reading(microgrid_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/{microgrid_id}/history", response_model=List[SensorReadingResponse])
-async def get_sensor_history(microgrid_id: str, limit: int = 100, db: Session = Depends(get_db)):
+async def get_sensor_history(microgrid_id: str, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
     """
     Get historical sensor readings.
     """
     try:
-        readings = db.query(SensorReading).filter(
-            SensorReading.microgrid_id == microgrid_id
-        ).order_by(SensorReading.timestamp.desc()).limit(limit).all()
+        readings = (await db.execute(_recent_readings(microgrid_id, limit))).mappings().all()
         
-        return [
-            SensorReadingResponse(
-                id=r.id,
-                microgrid_id=r.microgrid_id,
-                timestamp=r.timestamp,
-                irradiance=r.irradiance,
-                power_output=r.power_output,
-                temperature=r.temperature,
-                humidity=r.humidity,
-                wind_speed=r.wind_speed,
-                wind_direction=r.wind_direction
-            ) for r in readings
-        ]
+        # The rows already have the response fields and types - orjson encodes them as they
+        # are, skipping response-model validation and serialization of every reading
+        return ORJSONResponse(content=[dict(reading) for reading in readings])
     except Exception as e:
         logger.error(f"Error getting sensor history for {microgrid_id}: {e}", exc_info=True)
         # Return empty list on error instead of 500 (e.g., if table doesn't exist)
         return []
 
+
+@router.get("/{microgrid_id}/history/buckets", response_model=List[SensorReadingBucketResponse])
+async def get_bucketed_sensor_history(
+    microgrid_id: str,
+    bucket_minutes: int = 15,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get averaged sensor readings of the last `limit` buckets of bucket_minutes (5, 15 or 60).
+    """
+    if bucket_minutes not in HISTORY_BUCKET_MINUTES:
+        raise HTTPException(status_code=400, detail=f"bucket_minutes must be one of {list(HISTORY_BUCKET_MINUTES)}")
+
+    try:
+        return ORJSONResponse(content=await _bucketed_history(db, microgrid_id, limit, bucket_minutes))
+    except Exception as e:
+        logger.error(f"Error getting bucketed sensor history for {microgrid_id}: {e}", exc_info=True)
+        return []
+
+
+async def _bucketed_history(db: AsyncSession, microgrid_id: str, limit: int, bucket_minutes: int) -> List[dict]:
+    """Averages of the last `limit` buckets up to the microgrid's latest reading, newest first"""
+    global _has_aggregate
+
+    latest = (await db.execute(
+        select(func.max(SensorReading.timestamp)).where(SensorReading.microgrid_id == microgrid_id)
+    )).scalar()
+    if latest is None:
+        return []
+    seconds = bucket_minutes * 60
+    latest_bucket = int((latest.replace(tzinfo=None) - _EPOCH).total_seconds()) // seconds
+    since = _EPOCH + timedelta(seconds=(latest_bucket - limit + 1) * seconds)
+
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == 'postgresql' and _has_aggregate is None:
+        _has_aggregate = (await db.execute(
+            text("SELECT to_regclass('sensor_readings_5min') IS NOT NULL")
+        )).scalar()
+
+    if dialect_name == 'postgresql' and _has_aggregate:
+        bucket = func.time_bucket(timedelta(minutes=bucket_minutes), _aggregate.c.bucket)
+        readings = cast(func.sum(_aggregate.c.readings), Float)
+        rows = (await db.execute(
+            select(
+                bucket.label('bucket'),
+                readings.label('readings'),
+                (func.sum(_aggregate.c.irradiance_sum) / readings).label('irradiance'),
+                (func.sum(_aggregate.c.power_output_sum) / readings).label('power_output'),
+                (func.sum(_aggregate.c.temperature_sum) / readings).label('temperature'),
+                (func.sum(_aggregate.c.humidity_sum) / readings).label('humidity'),
+                (func.sum(_aggregate.c.wind_speed_sum)
+                 / func.nullif(cast(func.sum(_aggregate.c.wind_speed_readings), Float), 0)).label('wind_speed'),
+            ).where(
+                _aggregate.c.microgrid_id == microgrid_id,
+                _aggregate.c.bucket >= since,
+            ).group_by(bucket).order_by(bucket.desc())
+        )).mappings().all()
+        return [{**row, 'readings': int(row['readings'])} for row in rows]
+
+    bucket_number = epoch_seconds(dialect_name) // seconds
+    rows = (await db.execute(
+        select(
+            bucket_number.label('bucket_number'),
+            func.count(SensorReading.id).label('readings'),
+            func.avg(SensorReading.irradiance).label('irradiance'),
+            func.avg(SensorReading.power_output).label('power_output'),
+            func.avg(SensorReading.temperature).label('temperature'),
+            func.avg(SensorReading.humidity).label('humidity'),
+            func.avg(SensorReading.wind_speed).label('wind_speed'),
+        ).where(
+            SensorReading.microgrid_id == microgrid_id,
+            SensorReading.timestamp >= since,
+        ).group_by(bucket_number).order_by(bucket_number.desc())
+    )).mappings().all()
+    return [
+        {'bucket': _EPOCH + timedelta(seconds=row['bucket_number'] * seconds),
+         **{key: value for key, value in row.items() if key != 'bucket_number'}}
+        for row in rows
+    ]
+
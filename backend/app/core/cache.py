@@ -0,0 +1,156 @@
+"""
+Redis cache shared by all API workers.
+Every helper degrades to a cache miss when Redis is not installed or not reachable,
+so callers always keep the database as the source of truth.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Optional, Union
+from .config import settings
+from .metrics import REDIS_OP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Try to import the asyncio Redis client
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    logger.warning("redis not installed. API caching will be disabled.")
+
+# Channel announcing configuration changes to every worker
+CONFIG_UPDATES_CHANNEL = "config-updates"
+
+# Keep the request path snappy when Redis is down - fail fast and back off before retrying
+SOCKET_TIMEOUT_SECONDS = 0.25
+RETRY_AFTER_SECONDS = 30.0
+
+_client = None
+_unavailable_until = 0.0
+
+
+def status_key(microgrid_id: str) -> str:
+    """Cache key holding the serialized SystemStatus of a microgrid"""
+    return f"status:{microgrid_id}"
+
+
+def notification_preferences_key(microgrid_id: str) -> str:
+    """Cache key holding the serialized notification preferences of a microgrid"""
+    return f"prefs:{microgrid_id}"
+
+
+def latest_reading_key(microgrid_id: str) -> str:
+    """Cache key holding the serialized latest sensor reading of a microgrid"""
+    return f"sensors:{microgrid_id}:latest"
+
+
+def report_key(report: str, microgrid_id: str, period: str) -> str:
+    """Cache key holding a serialized report of a microgrid for one period"""
+    return f"report:{report}:{microgrid_id}:{period}"
+
+
+def get_redis():
+    """Return the shared Redis client, or None while Redis is unavailable"""
+    global _client
+    if not REDIS_AVAILABLE or time.monotonic() < _unavailable_until:
+        return None
+    if _client is None:
+        _client = aioredis.from_url(
+            settings.redis_url_processed,
+            decode_responses=True,
+            socket_connect_timeout=SOCKET_TIMEOUT_SECONDS,
+            socket_timeout=SOCKET_TIMEOUT_SECONDS
+        )
+    return _client
+
+
+def _mark_unavailable(error: Exception):
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + RETRY_AFTER_SECONDS
+    logger.warning(f"Redis unavailable, bypassing cache for {RETRY_AFTER_SECONDS:.0f}s: {error}")
+
+
+async def cache_get(key: str) -> Optional[str]:
+    """Get a cached value, None on miss or when Redis is unavailable"""
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        with REDIS_OP_SECONDS.labels('get').time():
+            return await client.get(key)
+    except Exception as e:
+        _mark_unavailable(e)
+        return None
+
+
+async def cache_set(key: str, value: Union[str, bytes], ttl_seconds: Optional[int] = None) -> bool:
+    """Store a value, optionally expiring after ttl_seconds"""
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        with REDIS_OP_SECONDS.labels('set').time():
+            await client.set(key, value, ex=ttl_seconds)
+        return True
+    except Exception as e:
+        _mark_unavailable(e)
+        return False
+
+
+async def cache_delete(*keys: str) -> bool:
+    """Drop cached values"""
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        with REDIS_OP_SECONDS.labels('delete').time():
+            await client.delete(*keys)
+        return True
+    except Exception as e:
+        _mark_unavailable(e)
+        return False
+
+
+async def publish(channel: str, message: str) -> bool:
+    """Publish a message to a Redis pub/sub channel"""
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        with REDIS_OP_SECONDS.labels('publish').time():
+            await client.publish(channel, message)
+        return True
+    except Exception as e:
+        _mark_unavailable(e)
+        return False
+
+
+async def subscribe(channel: str, handler: Callable[[str], None]):
+    """
+    Call handler with every message published to channel until cancelled.
+    Runs as a background task - reconnects after RETRY_AFTER_SECONDS when Redis goes away.
+    """
+    while True:
+        if not REDIS_AVAILABLE:
+            return
+        # Dedicated connection without the request-path socket timeout - it idles between messages
+        client = aioredis.from_url(
+            settings.redis_url_processed,
+            decode_responses=True,
+            socket_connect_timeout=SOCKET_TIMEOUT_SECONDS
+        )
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        handler(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Lost subscription to {channel}, retrying in {RETRY_AFTER_SECONDS:.0f}s: {e}")
+        finally:
+            await client.aclose()
+        await asyncio.sleep(RETRY_AFTER_SECONDS)
@@ -2,10 +2,13 @@ from celery import Celery
 from celery.schedules import crontab
 from .config import settings
 
+FORECAST_QUEUE = 'forecasts'
+
 celery_app = Celery(
     "suryादrishti",
     broker=settings.REDIS_URL,
-    backend=settings.REDIS_URL
+    backend=settings.REDIS_URL,
+    include=['app.tasks.forecast_tasks', 'app.tasks.rollup_tasks']
 )
 
 celery_app.conf.update(
@@ -14,14 +17,31 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='Asia/Kolkata',
     enable_utc=True,
+    # Publishers reuse pooled, kept-alive broker and result connections instead of
+    # opening one per .delay() - the 15-minute forecast fan-out enqueues in bursts
+    broker_pool_limit=settings.CELERY_BROKER_POOL_LIMIT,
+    broker_transport_options={'socket_keepalive': True},
+    redis_max_connections=settings.CELERY_REDIS_MAX_CONNECTIONS,
+    redis_socket_keepalive=True,
+    result_backend_transport_options={'retry_on_timeout': True},
+    # Forecasts mostly wait on weather/satellite APIs and the database - they get their own
+    # queue, consumed by a thread-pool worker:
+    #   celery -A app.core.celery_app worker -Q forecasts --pool=threads --concurrency=20
+    # Everything else (rollups, CPU-bound retraining) stays on the default prefork worker.
+    task_routes={
+        'app.tasks.forecast_tasks.generate_forecast_task': {'queue': FORECAST_QUEUE},
+    },
 )
 
 # Periodic tasks schedule
 celery_app.conf.beat_schedule = {
     'generate-forecasts-every-15min': {
-        'task': 'app.tasks.forecast_tasks.generate_forecast_task',
-        'schedule': crontab(minute='*/15'),  # Every 15 minutes
-        'args': ('all_microgrids',)
+        'task': 'app.tasks.forecast_tasks.enqueue_forecasts_task',
+        'schedule': crontab(minute='*/15'),  # Every 15 minutes, one subtask per microgrid
+    },
+    'refresh-sensor-rollups-every-5min': {
+        'task': 'app.tasks.rollup_tasks.refresh_sensor_rollups_task',
+        'schedule': crontab(minute='*/5'),
     },
     'retrain-models-weekly': {
         'task': 'app.tasks.forecast_tasks.retrain_models_task',
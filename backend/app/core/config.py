@@ -33,6 +33,10 @@ class Settings(BaseSettings):
         # Note: Railway domains like *.railway.app are handled in middleware
     ]
     
+    # Response compression - JSON bodies at least this large are gzipped for clients that accept it
+    GZIP_MINIMUM_SIZE: int = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+    GZIP_COMPRESS_LEVEL: int = int(os.getenv("GZIP_COMPRESS_LEVEL", "5"))  # 1-9 (Starlette defaults to 9 - much slower for little gain)
+    
     # Database
     # Railway provides DATABASE_URL automatically for PostgreSQL
     # For local development, use SQLite
@@ -52,6 +56,10 @@ class Settings(BaseSettings):
     DB_SSL_MODE: str = os.getenv("DB_SSL_MODE", "prefer")
     DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
     DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "5"))  # Seconds to wait for a pooled connection
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds before a connection is replaced
+    DB_QUERY_CACHE_SIZE: int = int(os.getenv("DB_QUERY_CACHE_SIZE", "1200"))  # Compiled SQL statements kept per engine
+    DB_PGBOUNCER: bool = os.getenv("DB_PGBOUNCER", "False").lower() == "true"  # DATABASE_URL points at PgBouncer (transaction pooling)
     
     # Redis Configuration
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -69,6 +77,8 @@ class Settings(BaseSettings):
     CELERY_ACCEPT_CONTENT: List[str] = ["json"]
     CELERY_TIMEZONE: str = "UTC"
     CELERY_ENABLE_UTC: bool = True
+    CELERY_BROKER_POOL_LIMIT: int = int(os.getenv("CELERY_BROKER_POOL_LIMIT", "50"))  # Broker connections kept open for publishing
+    CELERY_REDIS_MAX_CONNECTIONS: int = int(os.getenv("CELERY_REDIS_MAX_CONNECTIONS", "50"))  # Result backend connection pool size
     
     # Security
     # Generate strong secret key if not provided (required in production)
@@ -128,6 +138,9 @@ class Settings(BaseSettings):
     BATTERY_SOC_THRESHOLD: float = 60.0  # Minimum SOC for buffer mode
     DIESEL_START_THRESHOLD_MINUTES: int = 30  # Start diesel if drop > 30 min
     
+    # Sensor Ingest - queue readings and insert them in batches (POST /sensors/reading answers 202 without an id)
+    SENSOR_INGEST_BUFFERED: bool = os.getenv("SENSOR_INGEST_BUFFERED", "False").lower() == "true"
+    
     # Data Retention
     KEEP_FORECAST_HISTORY_DAYS: int = 90
     KEEP_SENSOR_DATA_DAYS: int = 365
@@ -168,7 +181,19 @@ class Settings(BaseSettings):
             separator = "&" if "?" in db_url else "?"
             db_url = f"{db_url}{separator}sslmode={self.DB_SSL_MODE}"
         return db_url
-    
+
+    @property
+    def database_url_async(self) -> str:
+        """Process DATABASE_URL for the async engine (asyncpg / aiosqlite drivers)"""
+        db_url = self.database_url_processed
+        if db_url.startswith("postgresql://"):
+            db_url = db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+            # asyncpg takes `ssl` instead of libpq's `sslmode`
+            db_url = db_url.replace("sslmode=", "ssl=", 1)
+        elif db_url.startswith("sqlite:///"):
+            db_url = db_url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+        return db_url
+
     @property
     def redis_url_processed(self) -> str:
         """Process Redis URL with authentication if needed"""
@@ -1,17 +1,33 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Generator, AsyncGenerator, List, Optional, Dict, Any
 from .config import settings
+from .metrics import instrument_engine, instrument_pool
+import asyncio
+import uuid
 import os
 
 # Use processed database URL from config (handles Railway PostgreSQL URLs and SSL)
 DATABASE_URL = settings.database_url_processed
+ASYNC_DATABASE_URL = settings.database_url_async
 
 # Create engine with appropriate configuration
 if DATABASE_URL.startswith('sqlite'):
     engine = create_engine(
         DATABASE_URL,
         connect_args={"check_same_thread": False},
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+        echo=settings.DEBUG
+    )
+    # aiosqlite connections are cheap and bound to the loop that opened them - don't pool
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=NullPool,
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
         echo=settings.DEBUG
     )
 else:
@@ -21,11 +37,54 @@ else:
         pool_pre_ping=True,  # Verify connections before using
         pool_size=settings.DB_POOL_SIZE,
         max_overflow=settings.DB_MAX_OVERFLOW,
-        pool_recycle=3600,  # Recycle connections after 1 hour
+        pool_timeout=settings.DB_POOL_TIMEOUT,  # Fail fast instead of queueing behind an exhausted pool
+        pool_recycle=settings.DB_POOL_RECYCLE,  # Replace connections before the server/proxy drops them
+        pool_use_lifo=True,  # Reuse the most recent connection - the rest sit idle and can be closed
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
         echo=settings.DEBUG
     )
+    # Behind PgBouncer in transaction-pooling mode consecutive transactions may run on different
+    # server connections, so asyncpg must not cache prepared statements or reuse their names
+    async_connect_args = {}
+    if settings.DB_PGBOUNCER:
+        async_connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__"
+        }
+    # asyncpg engine for endpoints that await their queries instead of blocking the event loop
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        connect_args=async_connect_args,
+        poolclass=AsyncAdaptedQueuePool,  # asyncio-safe queue - plain QueuePool blocks the event loop on checkout
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_use_lifo=True,
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+        echo=settings.DEBUG
+    )
+
+# Per-statement latency histograms (db_query_seconds), per-request statement counts and pool usage
+if settings.ENABLE_METRICS:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    instrument_pool(engine, 'sync')
+    instrument_pool(async_engine.sync_engine, 'async')
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+def dialect_insert(bind):
+    """INSERT construct with ON CONFLICT support for the bind's dialect (PostgreSQL or SQLite)"""
+    return pg_insert if bind.dialect.name == 'postgresql' else sqlite_insert
 
 def get_db() -> Generator[Session, None, None]:
     """Database dependency for FastAPI"""
@@ -35,4 +94,57 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+async def warm_up_async_pool() -> int:
+    """
+    Open pool_size connections up front so the first burst of requests doesn't pay
+    for connection setup (TLS + auth). Returns the number of connections opened.
+    """
+    if not isinstance(async_engine.pool, AsyncAdaptedQueuePool):
+        return 0
+    connections = await asyncio.gather(*(async_engine.connect() for _ in range(settings.DB_POOL_SIZE)))
+    # Checked-in connections stay open in the pool
+    await asyncio.gather(*(connection.close() for connection in connections))
+    return len(connections)
+
+def async_pool_status() -> Optional[Dict[str, Any]]:
+    """Checkout statistics of the async pool, None when connections aren't pooled (SQLite)"""
+    pool = async_engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return None
+    limit = pool.size() + settings.DB_MAX_OVERFLOW
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "idle": pool.checkedin(),
+        "limit": limit,
+        "saturated": checked_out >= limit
+    }
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Async database dependency for FastAPI"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    """Session factory dependency for endpoints that open several sessions (run_concurrently)"""
+    return AsyncSessionLocal
+
+async def run_concurrently(
+    *statements,
+    params: Optional[Dict[str, Any]] = None,
+    session_factory: Optional[async_sessionmaker] = None
+) -> List[list]:
+    """
+    Execute independent read-only statements in parallel and return the rows of each.
+    Every statement gets its own session - a single AsyncSession must not be used concurrently.
+    params are bound to every statement; each one only picks up the names it uses.
+    """
+    session_factory = session_factory or AsyncSessionLocal
+    
+    async def _run(statement):
+        async with session_factory() as db:
+            return (await db.execute(statement, params)).all()
+    
+    return list(await asyncio.gather(*(_run(statement) for statement in statements)))
 
@@ -2,70 +2,28 @@
 Database Migration Support
 Supports both SQLite (development) and PostgreSQL (production)
 """
-import os
 import logging
 from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.database import engine
 
 logger = logging.getLogger(__name__)
 
 
 def get_database_url() -> str:
     """
-    Get database URL from environment or config.
-    Supports both SQLite and PostgreSQL.
+    Get the database URL the application connects with.
+    Supports both SQLite and PostgreSQL (postgres:// URLs are normalized by settings).
     """
-    # Check for PostgreSQL connection string first
-    postgres_url = os.getenv('DATABASE_URL') or os.getenv('POSTGRES_URL')
-    
-    if postgres_url:
-        # Ensure it's a valid PostgreSQL URL
-        if not postgres_url.startswith('postgresql://') and not postgres_url.startswith('postgresql+psycopg2://'):
-            # Try to convert common formats
-            if postgres_url.startswith('postgres://'):
-                postgres_url = postgres_url.replace('postgres://', 'postgresql://', 1)
-            else:
-                logger.warning(f"Invalid PostgreSQL URL format: {postgres_url}")
-                postgres_url = None
-    
-    if postgres_url:
-        logger.info("Using PostgreSQL database")
-        return postgres_url
-    
-    # Fall back to SQLite
-    sqlite_path = os.getenv('SQLITE_DB_PATH', 'suryादrishti.db')
-    logger.info(f"Using SQLite database: {sqlite_path}")
-    return f"sqlite:///{sqlite_path}"
+    return settings.database_url_processed
 
 
 def create_database_engine():
-    """Create database engine with appropriate driver"""
-    database_url = get_database_url()
-    
-    if database_url.startswith('postgresql'):
-        # PostgreSQL - use asyncpg or psycopg2
-        try:
-            # Try asyncpg first (faster for async operations)
-            if 'asyncpg' not in database_url:
-                database_url = database_url.replace('postgresql://', 'postgresql+asyncpg://', 1)
-        except:
-            # Fall back to psycopg2
-            database_url = database_url.replace('postgresql+asyncpg://', 'postgresql+psycopg2://', 1)
-        
-        engine = create_engine(
-            database_url,
-            pool_pre_ping=True,  # Verify connections before using
-            pool_size=10,
-            max_overflow=20
-        )
-    else:
-        # SQLite
-        engine = create_engine(
-            database_url,
-            connect_args={"check_same_thread": False}  # SQLite-specific
-        )
-    
+    """
+    Return the application's engine.
+    There is a single engine per process (app.core.database) - a second one here would
+    open its own pool without the configured size, timeout and recycle settings.
+    """
     return engine
 
 
@@ -132,22 +90,10 @@ def migrate_to_postgresql(source_db_path: str, target_postgres_url: str):
 def check_database_connection():
     """Check if database connection is working"""
     try:
-        engine = create_database_engine()
-        with engine.connect() as conn:
+        with create_database_engine().connect() as conn:
             conn.execute(text("SELECT 1"))
         logger.info("Database connection successful")
         return True
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         return False
-
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,114 @@
+"""
+Prometheus metrics for request, database and Redis latency.
+Exposed by the /api/v1/metrics endpoint.
+"""
+import logging
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# More statements than this in one request usually means an N+1 query pattern
+# (reports legitimately issue four independent lookups)
+QUERY_COUNT_WARNING_THRESHOLD = 5
+
+REQUEST_SECONDS = Histogram(
+    'http_request_seconds',
+    'HTTP request latency',
+    ['endpoint']
+)
+DB_QUERY_SECONDS = Histogram(
+    'db_query_seconds',
+    'Database statement latency',
+    ['op']
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request',
+    'Database statements executed per HTTP request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+REDIS_OP_SECONDS = Histogram(
+    'redis_op_seconds',
+    'Redis command latency',
+    ['op']
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Connections of a database pool by state',
+    ['engine', 'state']
+)
+
+# Statement counter of the request being served - a mutable holder so concurrent
+# tasks spawned by the request (run_concurrently) add to the same count
+_request_query_count: ContextVar[Optional[List[int]]] = ContextVar('request_query_count', default=None)
+
+
+def _statement_op(statement: str, context) -> str:
+    """Metric label of a statement: its metrics_op execution option, else the SQL verb"""
+    if context is not None:
+        op = context.execution_options.get('metrics_op')
+        if op:
+            return op
+    return statement.split(None, 1)[0].lower() if statement else 'unknown'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    DB_QUERY_SECONDS.labels(_statement_op(statement, context)).observe(elapsed)
+    count = _request_query_count.get()
+    if count is not None:
+        count[0] += 1
+
+
+def instrument_engine(engine):
+    """Time every statement executed on a (sync) engine - pass async_engine.sync_engine for async engines"""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def instrument_pool(engine, name: str):
+    """Report a pooled engine's checked-out and idle connections, read at scrape time"""
+    pool = engine.pool
+    if not hasattr(pool, 'checkedout'):
+        # NullPool keeps no connections to count
+        return
+    DB_POOL_CONNECTIONS.labels(name, 'checked_out').set_function(pool.checkedout)
+    DB_POOL_CONNECTIONS.labels(name, 'idle').set_function(pool.checkedin)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording latency and database statement count per endpoint"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        count = [0]
+        token = _request_query_count.set(count)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_query_count.reset(token)
+            # Label by route template, not the raw path, to keep label cardinality bounded
+            route = scope.get('route')
+            endpoint = route.path if route is not None else 'unmatched'
+            REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+            DB_QUERIES_PER_REQUEST.labels(endpoint).observe(count[0])
+            if count[0] > QUERY_COUNT_WARNING_THRESHOLD:
+                logger.warning(
+                    "%s %s executed %d database statements (threshold %d)",
+                    scope['method'], endpoint, count[0], QUERY_COUNT_WARNING_THRESHOLD
+                )
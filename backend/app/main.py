@@ -1,13 +1,19 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.core.config import settings
 from app.api.v1 import forecast, alerts, microgrid, sensors, satellite, auth
 from app.api.v1 import forecast_microgrid, debug, devices, schedules, configurations, forecast_validation, forecast_run, notifications, reports, db_init, metrics, grid_providers
-from app.models.database import Base
-from app.core.database import engine
+from app.api.v1.microgrid import DEFAULT_CONFIGURATION, invalidate_generator_status
+from app.models.database import Base, Microgrid, SystemConfiguration, NotificationPreference, Schedule
+from app.core.database import engine, dialect_insert, run_concurrently, warm_up_async_pool, async_pool_status
+from app.core.cache import subscribe, CONFIG_UPDATES_CHANNEL, REDIS_AVAILABLE
+from app.core.metrics import RequestMetricsMiddleware
+from app.services.sensor_buffer import sensor_buffer
+from sqlalchemy import select, func, delete, inspect
 from typing import List
 import asyncio
 import logging
@@ -49,13 +55,55 @@ def is_origin_allowed(origin: str) -> bool:
 app = FastAPI(
     title="SuryaDrishti API",
     description="Real-time solar forecasting for rural microgrids",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Long-running tasks started at startup, cancelled on shutdown
+background_tasks: List[asyncio.Task] = []
+
+# Unique indexes added after their tables existed - the conflict targets of the upserts
+UPSERT_TARGET_MODELS = (NotificationPreference, Schedule)
+
+
+def ensure_unique_indexes():
+    """
+    Create the upsert conflict-target indexes on existing databases. Duplicates left by the old
+    check-then-insert code are deleted first, keeping the most recently updated row per key.
+    Raises if an index still can't be created.
+    """
+    inspector = inspect(engine)
+    for model in UPSERT_TARGET_MODELS:
+        table = model.__table__
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if not index.unique or index.name in existing:
+                continue
+            ranked = select(
+                table.c.id,
+                func.row_number().over(
+                    partition_by=list(index.columns),
+                    order_by=(table.c.updated_at.desc(), table.c.id.desc())
+                ).label('rank')
+            ).subquery()
+            with engine.begin() as conn:
+                deleted = conn.execute(
+                    delete(table).where(table.c.id.in_(select(ranked.c.id).where(ranked.c.rank > 1)))
+                ).rowcount
+                if deleted:
+                    logger.warning(f"Deleted {deleted} duplicate {table.name} rows before creating {index.name}")
+                index.create(bind=conn)
+            logger.info(f"Created unique index {index.name}")
+
+
 # Initialize database tables on startup
 @app.on_event("startup")
 async def startup_event():
     """Initialize database tables on application startup and seed default data"""
+    # uvicorn picks uvloop and httptools when uvicorn[standard] is installed, else plain asyncio
+    loop = asyncio.get_running_loop()
+    logger.info(f"Serving on {type(loop).__module__}.{type(loop).__name__}")
+    
     try:
         # Create all tables (this will create new tables but won't modify existing ones)
         # For production, you should use Alembic migrations to add new columns
@@ -134,6 +182,32 @@ async def startup_event():
             logger.warning(f"Could not add user device columns (may already exist): {migrate_error}")
             # Continue - columns might already exist
         
+        # Try to add max_reading_id to sensor_readings_15min if it doesn't exist. Rollups without it
+        # are rolled up again in full on the next refresh (see app.services.sensor_rollups)
+        try:
+            from sqlalchemy import text, inspect
+            inspector = inspect(engine)
+            if inspector.has_table('sensor_readings_15min'):
+                columns = [col['name'] for col in inspector.get_columns('sensor_readings_15min')]
+                if 'max_reading_id' not in columns:
+                    logger.info("Adding max_reading_id column to sensor_readings_15min table")
+                    with engine.connect() as conn:
+                        conn.execute(text("ALTER TABLE sensor_readings_15min ADD COLUMN max_reading_id INTEGER"))
+                        conn.commit()
+                    logger.info("Successfully added max_reading_id column")
+        except Exception as migrate_error:
+            logger.warning(f"Could not add max_reading_id column (may already exist): {migrate_error}")
+        
+        # create_all() only builds indexes together with new tables - add composite indexes
+        # introduced later to existing databases (unique ones: ensure_unique_indexes below)
+        from app.models.database import SensorReading, Forecast, Alert
+        for model in (SensorReading, Forecast, Alert):
+            try:
+                for index in model.__table__.indexes:
+                    index.create(bind=engine, checkfirst=True)
+            except Exception as index_error:
+                logger.warning(f"Could not create {model.__tablename__} indexes: {index_error}")
+        
         # Seed default data if microgrid_001 doesn't exist
         from app.core.database import SessionLocal
         from app.models.database import Microgrid, SensorReading, Device, SystemConfiguration
@@ -265,8 +339,52 @@ async def startup_event():
             logger.error(f"Failed to seed database: {e}", exc_info=True)
         finally:
             db.close()
+        
+        # Give every microgrid a configuration row once, here, so the status endpoint never writes
+        try:
+            with engine.begin() as conn:
+                missing = conn.execute(
+                    select(Microgrid.id).where(~Microgrid.configuration.has())
+                ).scalars().all()
+                if missing:
+                    conn.execute(
+                        dialect_insert(engine)(SystemConfiguration)
+                        .values([{'microgrid_id': microgrid_id, **DEFAULT_CONFIGURATION} for microgrid_id in missing])
+                        .on_conflict_do_nothing(index_elements=['microgrid_id'])
+                    )
+                    logger.info(f"Created default SystemConfiguration for {len(missing)} microgrid(s)")
+        except Exception as bootstrap_error:
+            logger.warning(f"Could not bootstrap system configurations: {bootstrap_error}")
+        
+        # Pre-open the async pool so the first requests don't pay for connection setup
+        try:
+            warmed = await warm_up_async_pool()
+            if warmed:
+                logger.info(f"Warmed up {warmed} async database connections")
+        except Exception as warm_error:
+            logger.warning(f"Could not warm up async database pool: {warm_error}")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}", exc_info=True)
+    
+    # Outside the best-effort block above - without these indexes every upsert fails, so don't start
+    ensure_unique_indexes()
+    
+    # Batch inserts of ingested sensor readings (flushed again when the task is cancelled at shutdown)
+    if settings.SENSOR_INGEST_BUFFERED:
+        background_tasks.append(sensor_buffer.start())
+    
+    # Drop generator statuses cached by this worker whenever any worker changes a configuration
+    if REDIS_AVAILABLE:
+        background_tasks.append(asyncio.create_task(
+            subscribe(CONFIG_UPDATES_CHANNEL, invalidate_generator_status)
+        ))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
 
 # CORS Middleware - Allow Railway domains dynamically
 # Use a more permissive approach for Railway deployments
@@ -280,6 +398,17 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Gzip responses (base64 images and cloud masks compress several-fold)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.GZIP_MINIMUM_SIZE,
+    compresslevel=settings.GZIP_COMPRESS_LEVEL,
+)
+
+# Request latency and database statements per endpoint (see /api/v1/metrics)
+if settings.ENABLE_METRICS:
+    app.add_middleware(RequestMetricsMiddleware)
+
 # Handle OPTIONS preflight requests explicitly for CORS
 @app.options("/{full_path:path}")
 async def options_handler(request: Request, full_path: str):
@@ -406,47 +535,42 @@ manager = ConnectionManager()
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "suryादrishti"}
+    pool = async_pool_status()
+    if pool and pool["saturated"]:
+        # Every pooled connection is checked out - new requests are queueing for the database
+        return {"status": "degraded", "service": "suryादrishti", "database_pool": pool}
+    return {"status": "healthy", "service": "suryादrishti", "database_pool": pool}
 
 @app.get("/api/v1/health/database")
 async def health_check_database():
     """Health check endpoint that verifies database connectivity and microgrid existence"""
     try:
-        from app.core.database import SessionLocal
-        from app.models.database import Microgrid
+        # Test database connection - both lookups are independent, run them side by side
+        count_rows, microgrid_rows = await run_concurrently(
+            select(func.count()).select_from(Microgrid),
+            select(
+                Microgrid.id,
+                Microgrid.name,
+                Microgrid.latitude,
+                Microgrid.longitude,
+                Microgrid.capacity_kw
+            ).where(Microgrid.id == 'microgrid_001')
+        )
+        microgrid_count = count_rows[0][0]
+        microgrid_001 = microgrid_rows[0] if microgrid_rows else None
         
-        db = SessionLocal()
-        try:
-            # Test database connection
-            microgrid_count = db.query(Microgrid).count()
-            microgrid_001 = db.query(Microgrid).filter(Microgrid.id == 'microgrid_001').first()
-            
-            return {
-                "status": "healthy",
-                "database": "connected",
-                "microgrid_count": microgrid_count,
-                "microgrid_001_exists": microgrid_001 is not None,
-                "microgrid_001_details": {
-                    "id": microgrid_001.id,
-                    "name": microgrid_001.name,
-                    "latitude": microgrid_001.latitude,
-                    "longitude": microgrid_001.longitude,
-                    "capacity_kw": microgrid_001.capacity_kw
-                } if microgrid_001 else None
-            }
-        except Exception as e:
-            logger.error(f"Database health check failed: {e}", exc_info=True)
-            return {
-                "status": "unhealthy",
-                "database": "error",
-                "error": str(e)
-            }
-        finally:
-            db.close()
+        return {
+            "status": "healthy",
+            "database": "connected",
+            "microgrid_count": microgrid_count,
+            "microgrid_001_exists": microgrid_001 is not None,
+            "microgrid_001_details": dict(microgrid_001._mapping) if microgrid_001 else None
+        }
     except Exception as e:
-        logger.error(f"Health check failed: {e}", exc_info=True)
+        logger.error(f"Database health check failed: {e}", exc_info=True)
         return {
             "status": "unhealthy",
+            "database": "error",
             "error": str(e)
         }
 
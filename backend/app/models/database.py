@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, JSON, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, Float, String, DateTime, JSON, ForeignKey, Text, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -44,6 +44,8 @@ class Microgrid(Base):
     sensor_readings = relationship("SensorReading", back_populates="microgrid")
     alerts = relationship("Alert", back_populates="microgrid")
     notification_preferences = relationship("NotificationPreference", back_populates="microgrid")
+    devices = relationship("Device", back_populates="microgrid")
+    configuration = relationship("SystemConfiguration", back_populates="microgrid", uselist=False)
 
 class Forecast(Base):
     __tablename__ = "forecasts"
@@ -62,6 +64,11 @@ class Forecast(Base):
     actual_power_output = Column(Float, nullable=True)
     
     microgrid = relationship("Microgrid", back_populates="forecasts")
+    
+    # Per-microgrid time-window queries become a bounded range scan already in timestamp order
+    __table_args__ = (
+        Index('ix_forecasts_microgrid_id_timestamp', microgrid_id, timestamp),
+    )
 
 class SensorReading(Base):
     __tablename__ = "sensor_readings"
@@ -79,6 +86,27 @@ class SensorReading(Base):
     wind_direction = Column(Float, nullable=True)  # degrees
     
     microgrid = relationship("Microgrid", back_populates="sensor_readings")
+    
+    # Latest-reading lookups walk this index backwards instead of sorting the table;
+    # on PostgreSQL it also carries the status columns so the lookup is an index-only scan
+    __table_args__ = (
+        Index(
+            'ix_sensor_readings_microgrid_id_timestamp',
+            microgrid_id,
+            timestamp.desc(),
+            postgresql_include=['power_output', 'irradiance']
+        ),
+    )
+
+class SensorReadingRollup(Base):
+    """Energy per microgrid per 15-minute bucket - maintained by app.services.sensor_rollups"""
+    __tablename__ = "sensor_readings_15min"
+    
+    microgrid_id = Column(String, ForeignKey("microgrids.id"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Bucket start
+    energy_kwh = Column(Float, nullable=False)  # SUM(power_output) * 0.25
+    readings = Column(Integer, nullable=False)
+    max_reading_id = Column(Integer, nullable=True)  # Highest sensor_readings.id rolled into the bucket
 
 class Alert(Base):
     __tablename__ = "alerts"
@@ -93,6 +121,11 @@ class Alert(Base):
     acknowledged = Column(Integer, default=0)  # 0 or 1 for SQLite compatibility
     
     microgrid = relationship("Microgrid", back_populates="alerts")
+    
+    # Time-window queries per microgrid; severity is included so severity filters are answered from the index
+    __table_args__ = (
+        Index('ix_alerts_microgrid_id_timestamp_severity', microgrid_id, timestamp, severity),
+    )
 
 class Device(Base):
     __tablename__ = "devices"
@@ -109,7 +142,7 @@ class Device(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    microgrid = relationship("Microgrid")
+    microgrid = relationship("Microgrid", back_populates="devices")
 
 class Schedule(Base):
     __tablename__ = "schedules"
@@ -124,12 +157,17 @@ class Schedule(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     microgrid = relationship("Microgrid")
+    
+    # One schedule per microgrid and date - the conflict target of the schedule upsert
+    __table_args__ = (
+        Index('uq_schedules_microgrid_id_date', microgrid_id, date, unique=True),
+    )
 
 class NotificationPreference(Base):
     __tablename__ = "notification_preferences"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    microgrid_id = Column(String, ForeignKey("microgrids.id"), nullable=False, index=True)
+    microgrid_id = Column(String, ForeignKey("microgrids.id"), nullable=False)
     phone_number = Column(String, nullable=True)  # E.164 format
     email = Column(String, nullable=True)
     enable_sms = Column(Boolean, default=True)
@@ -142,6 +180,11 @@ class NotificationPreference(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     microgrid = relationship("Microgrid", back_populates="notification_preferences")
+    
+    # One row per microgrid - the conflict target of the preferences upsert
+    __table_args__ = (
+        Index('uq_notification_preferences_microgrid_id', microgrid_id, unique=True),
+    )
 
 class SystemConfiguration(Base):
     __tablename__ = "system_configurations"
@@ -178,6 +221,6 @@ class SystemConfiguration(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    microgrid = relationship("Microgrid")
+    microgrid = relationship("Microgrid", back_populates="configuration")
 
 
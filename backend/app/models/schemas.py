@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -75,6 +75,8 @@ class SensorReadingRequest(BaseModel):
     wind_direction: Optional[float] = None
 
 class SensorReadingResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     microgrid_id: str
     timestamp: datetime
@@ -85,6 +87,15 @@ class SensorReadingResponse(BaseModel):
     wind_speed: Optional[float] = None
     wind_direction: Optional[float] = None
 
+class SensorReadingBucketResponse(BaseModel):
+    bucket: datetime  # Bucket start
+    readings: int
+    irradiance: float  # Averages over the bucket's readings
+    power_output: float
+    temperature: float
+    humidity: float
+    wind_speed: Optional[float] = None
+
 # Alert Models
 class AlertResponse(BaseModel):
     id: int
@@ -244,7 +244,7 @@ def convert_to_microgrid_forecast_format(
         timestamp = point.get('timestamp') or point.get('time')
         if isinstance(timestamp, str):
             try:
-                point_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+                point_time = datetime.fromisoformat(timestamp)  # Accepts a trailing 'Z'
             except:
                 point_time = datetime.utcnow()
         else:
@@ -0,0 +1,98 @@
+"""
+Write-back buffer for sensor readings (SENSOR_INGEST_BUFFERED).
+Ingest requests queue their row and return; one background task inserts the queued rows
+in batches - one transaction per batch instead of one per reading.
+"""
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.core.database import AsyncSessionLocal
+from app.core.cache import cache_delete, latest_reading_key
+from app.models.database import SensorReading
+from typing import List, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A batch is written once it has this many rows or its first row has waited this long
+FLUSH_MAX_ROWS = 500
+FLUSH_INTERVAL_SECONDS = 0.1
+
+# Ingest requests wait (backpressure) once the database falls this far behind
+MAX_QUEUED_ROWS = 50_000
+
+
+class SensorReadingBuffer:
+    def __init__(self, session_factory: Optional[async_sessionmaker] = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self) -> asyncio.Task:
+        """Start the flush loop on the running event loop. Cancel the task to flush and stop."""
+        self.queue = asyncio.Queue(maxsize=MAX_QUEUED_ROWS)
+        self.task = asyncio.create_task(self._run())
+        return self.task
+
+    async def put(self, row: dict):
+        """Queue a sensor_readings row for the next batch"""
+        await self.queue.put(row)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch: List[dict] = []
+        try:
+            while True:
+                batch.append(await self.queue.get())
+                deadline = loop.time() + FLUSH_INTERVAL_SECONDS
+                while len(batch) < FLUSH_MAX_ROWS:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        try:
+                            batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                        except asyncio.TimeoutError:
+                            break
+                # Swap the batch out first - a cancel during the flush must not write it twice
+                pending, batch = batch, []
+                await self._flush(pending)
+        except asyncio.CancelledError:
+            # Shutdown - write everything already accepted before stopping
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if batch:
+                await self._flush(batch)
+            raise
+
+    async def _flush(self, batch: List[dict]):
+        try:
+            await self._insert(batch)
+        except Exception as batch_error:
+            # One bad reading (e.g. an unknown microgrid) fails the whole statement -
+            # retry row by row so only that reading is lost
+            logger.warning(f"Batch insert of {len(batch)} sensor readings failed, retrying one by one: {batch_error}")
+            for row in batch:
+                try:
+                    await self._insert([row])
+                except Exception as row_error:
+                    logger.error(f"Dropped sensor reading for microgrid {row.get('microgrid_id')}: {row_error}")
+        # The cached latest readings are now stale (ids are only known to the database)
+        await cache_delete(*{latest_reading_key(row['microgrid_id']) for row in batch})
+
+    async def _insert(self, rows: List[dict]):
+        async with self.session_factory() as db:
+            if db.get_bind().dialect.name == 'postgresql':
+                # The readings were acknowledged when queued - don't wait for the WAL flush either
+                await db.execute(text("SET LOCAL synchronous_commit = OFF"))
+            await db.execute(insert(SensorReading), rows)
+            await db.commit()
+
+
+sensor_buffer = SensorReadingBuffer()
@@ -0,0 +1,164 @@
+"""
+15-minute energy rollups of sensor readings (sensor_readings_15min).
+Reports sum the pre-aggregated buckets and only read raw readings for the partial
+buckets at the edges of their window and for buckets not materialized yet.
+Readings that arrive late for already materialized buckets (e.g. a site syncing its
+backlog after an outage) are found by id and their buckets are rolled up again.
+"""
+from sqlalchemy import select, func, cast, bindparam, BigInteger, or_, and_
+from sqlalchemy.orm import Session
+from app.core.database import dialect_insert
+from app.models.database import SensorReading, SensorReadingRollup
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 15 * 60
+BUCKET = timedelta(seconds=BUCKET_SECONDS)
+
+# Buckets re-aggregated behind the newest materialized one on every refresh
+REFRESH_LOOKBACK = timedelta(hours=2)
+UPSERT_BATCH_SIZE = 1000
+
+# Readings with ids above the highest rolled-up id (less this margin) are new since the last
+# refresh. The margin covers ids allocated before the refresh whose transactions committed after it.
+LATE_READING_ID_MARGIN = 10_000
+
+# Readings are assumed to be 15 minutes apart - energy of a reading is power_output * 0.25 h
+READING_HOURS = 0.25
+
+# Everything before the end of the newest bucket has been materialized
+NEWEST_ROLLUP_QUERY = select(func.max(SensorReadingRollup.bucket))
+
+# Newest bucket and highest reading id rolled up so far
+ROLLUP_STATE_QUERY = select(func.max(SensorReadingRollup.bucket), func.max(SensorReadingRollup.max_reading_id))
+
+
+def floor_bucket(ts: datetime) -> datetime:
+    """Start of the bucket containing ts"""
+    return ts.replace(minute=ts.minute - ts.minute % 15, second=0, microsecond=0)
+
+
+def ceil_bucket(ts: datetime) -> datetime:
+    """Start of the first bucket beginning at or after ts"""
+    start = floor_bucket(ts)
+    return start if start == ts else start + BUCKET
+
+
+def epoch_seconds(dialect_name: str, column=SensorReading.timestamp):
+    """SQL expression of a timestamp column as whole seconds since the epoch"""
+    if dialect_name == 'postgresql':
+        return cast(func.floor(func.extract('epoch', column)), BigInteger)
+    return cast(func.strftime('%s', column), BigInteger)
+
+
+def _bucket_number(dialect_name: str):
+    """SQL expression numbering the 15-minute bucket of a reading (seconds since the epoch / 900)"""
+    return epoch_seconds(dialect_name) // BUCKET_SECONDS
+
+
+def refresh_sensor_rollups(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Materialize every complete bucket since the refresh lookback (everything on the first run),
+    and roll up again the older buckets that readings arrived late for.
+    Returns the number of buckets written.
+    """
+    until = floor_bucket(now or datetime.utcnow())
+    newest, rolled_id = db.execute(ROLLUP_STATE_QUERY).one()
+
+    bucket_number = _bucket_number(db.get_bind().dialect.name).label('bucket_number')
+    aggregate = select(
+        SensorReading.microgrid_id,
+        bucket_number,
+        func.coalesce(func.sum(SensorReading.power_output), 0.0).label('power_sum'),
+        func.count(SensorReading.id).label('readings'),
+        func.max(SensorReading.id).label('max_reading_id')
+    ).where(SensorReading.timestamp < until)
+    # Without a rolled-up id (first run, or rollups from before ids were tracked) roll up everything
+    if newest is not None and rolled_id is not None:
+        since = newest - REFRESH_LOOKBACK
+        # Oldest reading per microgrid that arrived since the last refresh, behind the lookback
+        late = db.execute(
+            select(SensorReading.microgrid_id, func.min(SensorReading.timestamp)).where(
+                SensorReading.id > rolled_id - LATE_READING_ID_MARGIN,
+                SensorReading.timestamp < since
+            ).group_by(SensorReading.microgrid_id)
+        ).all()
+        aggregate = aggregate.where(or_(
+            SensorReading.timestamp >= since,
+            *(
+                and_(SensorReading.microgrid_id == microgrid_id, SensorReading.timestamp >= floor_bucket(oldest))
+                for microgrid_id, oldest in late
+            )
+        ))
+    aggregate = aggregate.group_by(SensorReading.microgrid_id, bucket_number)
+
+    rows = [
+        {
+            'microgrid_id': row.microgrid_id,
+            'bucket': datetime(1970, 1, 1) + timedelta(seconds=int(row.bucket_number) * BUCKET_SECONDS),
+            'energy_kwh': float(row.power_sum) * READING_HOURS,
+            'readings': row.readings,
+            'max_reading_id': row.max_reading_id
+        }
+        for row in db.execute(aggregate)
+    ]
+    insert = dialect_insert(db.get_bind())
+    # Batched to stay under the bind-parameter limit on the first (full) run
+    for batch_start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        upsert = insert(SensorReadingRollup).values(rows[batch_start:batch_start + UPSERT_BATCH_SIZE])
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=['microgrid_id', 'bucket'],
+            set_={
+                'energy_kwh': upsert.excluded.energy_kwh,
+                'readings': upsert.excluded.readings,
+                'max_reading_id': upsert.excluded.max_reading_id
+            }
+        ))
+    db.commit()
+    logger.info("Refreshed %d sensor rollup buckets before %s", len(rows), until)
+    return len(rows)
+
+
+def rolled_window(start: datetime, end: datetime, newest_rollup: Optional[datetime]) -> Optional[Tuple[datetime, datetime]]:
+    """
+    The whole materialized buckets inside [start, end) as (rolled_from, rolled_until),
+    None when there are none. newest_rollup is the result of NEWEST_ROLLUP_QUERY.
+    """
+    if newest_rollup is None:
+        return None
+    rolled_from = ceil_bucket(start)
+    rolled_until = min(floor_bucket(end), newest_rollup + BUCKET)
+    if rolled_until <= rolled_from:
+        return None
+    return rolled_from, rolled_until
+
+
+_RAW_WINDOW = (
+    SensorReading.microgrid_id == bindparam('microgrid_id'),
+    SensorReading.timestamp >= bindparam('start'),
+    SensorReading.timestamp < bindparam('end')
+)
+
+# Energy (kWh) of a microgrid's readings in [start, end), summed from the raw readings
+RAW_ENERGY_QUERY = select(
+    func.coalesce(func.sum(SensorReading.power_output), 0.0) * READING_HOURS
+).where(*_RAW_WINDOW)
+
+# The same, with the whole buckets in [rolled_from, rolled_until) read from the rollup (see rolled_window)
+ROLLED_ENERGY_QUERY = select(
+    select(func.coalesce(func.sum(SensorReadingRollup.energy_kwh), 0.0)).where(
+        SensorReadingRollup.microgrid_id == bindparam('microgrid_id'),
+        SensorReadingRollup.bucket >= bindparam('rolled_from'),
+        SensorReadingRollup.bucket < bindparam('rolled_until')
+    ).scalar_subquery()
+    + select(func.coalesce(func.sum(SensorReading.power_output), 0.0) * READING_HOURS).where(
+        *_RAW_WINDOW,
+        or_(
+            SensorReading.timestamp < bindparam('rolled_from'),
+            SensorReading.timestamp >= bindparam('rolled_until')
+        )
+    ).scalar_subquery()
+)
@@ -1,17 +1,28 @@
-from celery import shared_task
+from celery import shared_task, group
 from app.services.irradiance_predictor import IrradiancePredictor
 from app.models.database import Forecast, Microgrid
 from app.core.database import SessionLocal
+from functools import lru_cache
 import asyncio
 import json
+import threading
 from datetime import datetime
 
+# Forecast subtasks run concurrently on the threads worker - only the first one loads the models
+_predictor_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _get_predictor() -> IrradiancePredictor:
+    """One predictor per worker process - its models are loaded once, on first use"""
+    return IrradiancePredictor()
+
 @shared_task
 def generate_forecast_task(microgrid_id: str):
     """
     Background task to generate forecast every 15 minutes.
     """
-    predictor = IrradiancePredictor()
+    with _predictor_lock:
+        predictor = _get_predictor()
     db = SessionLocal()
     
     try:
@@ -60,6 +71,23 @@ def generate_forecast_task(microgrid_id: str):
     finally:
         db.close()
 
+@shared_task
+def enqueue_forecasts_task():
+    """
+    Fan out the 15-minute forecast run: one generate_forecast_task per microgrid,
+    so the run scales with forecast workers instead of looping over every site in one task.
+    """
+    db = SessionLocal()
+    
+    try:
+        microgrid_ids = [microgrid_id for (microgrid_id,) in db.query(Microgrid.id).all()]
+    finally:
+        db.close()
+    
+    # Only ids cross the broker - each subtask opens its own session
+    group(generate_forecast_task.s(microgrid_id) for microgrid_id in microgrid_ids).apply_async()
+    print(f"[INFO] Enqueued forecasts for {len(microgrid_ids)} microgrids")
+
 @shared_task
 def retrain_models_task():
     """
@@ -0,0 +1,19 @@
+from celery import shared_task
+from app.core.database import SessionLocal
+from app.services.sensor_rollups import refresh_sensor_rollups
+
+@shared_task
+def refresh_sensor_rollups_task():
+    """
+    Background task to materialize complete 15-minute energy buckets every 5 minutes.
+    """
+    db = SessionLocal()
+    
+    try:
+        buckets = refresh_sensor_rollups(db)
+        print(f"[SUCCESS] Refreshed {buckets} sensor rollup buckets")
+    except Exception as e:
+        print(f"[ERROR] Error refreshing sensor rollups: {e}")
+        db.rollback()
+    finally:
+        db.close()
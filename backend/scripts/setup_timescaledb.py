@@ -0,0 +1,132 @@
+"""
+Turn sensor_readings into a TimescaleDB hypertable with compression and retention policies,
+plus the 5-minute continuous aggregate behind /sensors/{id}/history/buckets.
+Run once against a PostgreSQL database with the timescaledb extension available
+(after the tables exist); running it again is a no-op.
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.database import engine
+
+# One chunk per day - recent chunks stay in memory, history/report windows prune to a few chunks
+CHUNK_TIME_INTERVAL = '1 day'
+
+# Chunks older than this are compressed, segmented by microgrid so per-microgrid reads
+# only decompress their own segments. Late readings for compressed chunks are rare.
+COMPRESS_AFTER = '7 days'
+
+# 5-minute sums per microgrid, refreshed every minute for the last two days. Sums and counts
+# (not averages) so /history/buckets can roll them up exactly into 15- and 60-minute buckets.
+CONTINUOUS_AGGREGATE = 'sensor_readings_5min'
+AGGREGATE_REFRESH_START = '2 days'
+AGGREGATE_REFRESH_END = '1 minute'
+AGGREGATE_REFRESH_EVERY = '1 minute'
+
+
+def setup_timescaledb():
+    """Convert sensor_readings to a hypertable partitioned on timestamp"""
+    if engine.dialect.name != 'postgresql':
+        print("✗ TimescaleDB needs PostgreSQL - skipping (DATABASE_URL is not a PostgreSQL URL)")
+        return
+
+    with engine.begin() as conn:
+        available = conn.execute(text(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'timescaledb'"
+        )).first()
+        if not available:
+            print("✗ The timescaledb extension is not installed on this server - skipping")
+            return
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb"))
+        print("✓ timescaledb extension enabled")
+
+        is_hypertable = conn.execute(text(
+            "SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = 'sensor_readings'"
+        )).first()
+        if not is_hypertable:
+            # Unique constraints of a hypertable must include the partitioning column -
+            # the primary key becomes (id, timestamp); ids stay unique through their sequence
+            missing = conn.execute(text(
+                "SELECT count(*) FROM sensor_readings WHERE timestamp IS NULL"
+            )).scalar()
+            if missing:
+                raise RuntimeError(f"{missing} sensor readings have no timestamp - fix or delete them first")
+            conn.execute(text("ALTER TABLE sensor_readings DROP CONSTRAINT IF EXISTS sensor_readings_pkey"))
+            conn.execute(text("ALTER TABLE sensor_readings ADD PRIMARY KEY (id, timestamp)"))
+            conn.execute(text(
+                "SELECT create_hypertable('sensor_readings', 'timestamp', "
+                "chunk_time_interval => CAST(:interval AS INTERVAL), migrate_data => TRUE)"
+            ), {"interval": CHUNK_TIME_INTERVAL})
+            print(f"✓ sensor_readings is now a hypertable ({CHUNK_TIME_INTERVAL} chunks)")
+        else:
+            print("✓ sensor_readings is already a hypertable")
+
+        # Compression settings can't change once chunks are compressed - only set them the first time
+        compressed = conn.execute(text(
+            "SELECT 1 FROM timescaledb_information.compression_settings WHERE hypertable_name = 'sensor_readings'"
+        )).first()
+        if not compressed:
+            conn.execute(text(
+                "ALTER TABLE sensor_readings SET ("
+                "timescaledb.compress, "
+                "timescaledb.compress_segmentby = 'microgrid_id', "
+                "timescaledb.compress_orderby = 'timestamp DESC')"
+            ))
+        conn.execute(text(
+            "SELECT add_compression_policy('sensor_readings', CAST(:after AS INTERVAL), if_not_exists => TRUE)"
+        ), {"after": COMPRESS_AFTER})
+        print(f"✓ Chunks older than {COMPRESS_AFTER} are compressed")
+
+        conn.execute(text(
+            "SELECT add_retention_policy('sensor_readings', CAST(:keep AS INTERVAL), if_not_exists => TRUE)"
+        ), {"keep": f"{settings.KEEP_SENSOR_DATA_DAYS} days"})
+        print(f"✓ Readings older than {settings.KEEP_SENSOR_DATA_DAYS} days are dropped")
+
+        aggregate_exists = conn.execute(text(
+            "SELECT 1 FROM timescaledb_information.continuous_aggregates WHERE view_name = :name"
+        ), {"name": CONTINUOUS_AGGREGATE}).first()
+        if not aggregate_exists:
+            conn.execute(text(f"""
+                CREATE MATERIALIZED VIEW {CONTINUOUS_AGGREGATE}
+                WITH (timescaledb.continuous) AS
+                SELECT microgrid_id,
+                       time_bucket(INTERVAL '5 minutes', timestamp) AS bucket,
+                       sum(irradiance) AS irradiance_sum,
+                       sum(power_output) AS power_output_sum,
+                       sum(temperature) AS temperature_sum,
+                       sum(humidity) AS humidity_sum,
+                       sum(wind_speed) AS wind_speed_sum,
+                       count(wind_speed) AS wind_speed_readings,
+                       count(*) AS readings
+                FROM sensor_readings
+                GROUP BY microgrid_id, bucket
+                WITH NO DATA
+            """))
+        conn.execute(text(
+            "SELECT add_continuous_aggregate_policy(:name, "
+            "start_offset => CAST(:start AS INTERVAL), end_offset => CAST(:end AS INTERVAL), "
+            "schedule_interval => CAST(:every AS INTERVAL), if_not_exists => TRUE)"
+        ), {"name": CONTINUOUS_AGGREGATE, "start": AGGREGATE_REFRESH_START,
+            "end": AGGREGATE_REFRESH_END, "every": AGGREGATE_REFRESH_EVERY})
+        print(f"✓ {CONTINUOUS_AGGREGATE} refreshes every {AGGREGATE_REFRESH_EVERY}")
+
+    if not aggregate_exists:
+        # The policy only covers recent buckets - materialize the existing history once.
+        # refresh_continuous_aggregate can't run inside a transaction block.
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(
+                "CALL refresh_continuous_aggregate(:name, NULL, now() - CAST(:end AS INTERVAL))"
+            ), {"name": CONTINUOUS_AGGREGATE, "end": AGGREGATE_REFRESH_END})
+        print(f"✓ {CONTINUOUS_AGGREGATE} backfilled from existing readings")
+
+    print("\n✓ TimescaleDB setup complete!")
+
+
+if __name__ == "__main__":
+    setup_timescaledb()
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import NullPool
+from types import SimpleNamespace
+from datetime import datetime
+import asyncio
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from app.main import app
+from app.core.database import get_async_db, get_async_sessionmaker
+from app.models.database import Base, Microgrid
+
+
+@pytest.fixture
+def seed_db():
+    """Rows every API test database starts with - override in a test class to seed more"""
+    def seed(db):
+        db.add(Microgrid(id='microgrid_001', name='Test Grid', latitude=28.4595,
+                         longitude=77.0266, capacity_kw=50.0, created_at=datetime.utcnow()))
+    return seed
+
+
+@pytest.fixture
+def api_db(tmp_path, seed_db):
+    """
+    Temporary SQLite database behind the async API dependencies (get_async_db and
+    get_async_sessionmaker), created and seeded synchronously.
+    Yields Session (sync sessionmaker), async_engine and async_sessions.
+    """
+    db_path = tmp_path / 'api_test.db'
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        seed_db(db)
+        db.commit()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+    async_sessions = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with async_sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: async_sessions
+    yield SimpleNamespace(Session=Session, async_engine=async_engine, async_sessions=async_sessions)
+    app.dependency_overrides.pop(get_async_db, None)
+    app.dependency_overrides.pop(get_async_sessionmaker, None)
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
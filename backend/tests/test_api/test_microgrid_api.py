@@ -0,0 +1,177 @@
+import pytest
+from contextlib import contextmanager
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from datetime import datetime
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from app.main import app
+from app.core.metrics import instrument_engine
+from app.api.v1.microgrid import _generator_status_cache, _microgrid_cache
+from app.models.database import Microgrid, SensorReading, Device, SystemConfiguration
+
+
+@contextmanager
+def count_queries(engine):
+    """Collect every SQL statement executed on the engine inside the block"""
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+class TestMicrogridAPI:
+    @pytest.fixture
+    def seed_db(self):
+        def seed(db):
+            db.add(Microgrid(id='microgrid_001', name='Test Grid', latitude=28.4595,
+                             longitude=77.0266, capacity_kw=50.0, created_at=datetime.utcnow()))
+            db.add(SensorReading(microgrid_id='microgrid_001', irradiance=850.0, power_output=42.5,
+                                 temperature=32.0, humidity=45.0, wind_speed=3.5,
+                                 timestamp=datetime.utcnow()))
+            db.add_all([
+                Device(microgrid_id='microgrid_001', name='Essential Loads', power_consumption_watts=5000,
+                       device_type='essential', is_active=True),
+                Device(microgrid_id='microgrid_001', name='Irrigation Pump', power_consumption_watts=3000,
+                       device_type='flexible', is_active=True),
+            ])
+            db.add(SystemConfiguration(microgrid_id='microgrid_001', generator_status='off'))
+            # Freshly registered microgrid - no readings, devices or configuration yet
+            db.add(Microgrid(id='microgrid_002', name='New Grid', latitude=26.9124,
+                             longitude=75.7873, capacity_kw=20.0, created_at=datetime.utcnow()))
+        return seed
+
+    @pytest.fixture
+    def async_engine(self, api_db):
+        instrument_engine(api_db.async_engine.sync_engine)
+        _generator_status_cache.clear()
+        _microgrid_cache.clear()
+        yield api_db.async_engine
+        _generator_status_cache.clear()
+        _microgrid_cache.clear()
+
+    @pytest.fixture
+    def client(self, async_engine):
+        return TestClient(app)
+
+    def test_system_status_query_count(self, client, async_engine):
+        """Status of a known microgrid is served from a single statement"""
+        client.get("/api/v1/microgrid/microgrid_001")
+        with count_queries(async_engine.sync_engine) as queries:
+            response = client.get("/api/v1/microgrid/microgrid_001/status")
+        assert response.status_code == 200
+        assert len(queries) == 1
+
+        data = response.json()
+        assert data["loads"]["critical"] == 5.0
+        assert data["loads"]["nonCritical"] == 3.0
+        assert data["solar_generation_kw"] == 42.5
+
+    def test_system_status_unknown_microgrid_is_read_only(self, client, async_engine):
+        """Status for a missing microgrid is a 404 and never inserts rows"""
+        with count_queries(async_engine.sync_engine) as queries:
+            response = client.get("/api/v1/microgrid/unknown_grid/status")
+        assert response.status_code == 404
+        assert not any(q.lstrip().upper().startswith("INSERT") for q in queries)
+
+    def test_system_status_without_configuration_is_read_only(self, client, async_engine):
+        """A microgrid without configuration reports the default generator status without writing"""
+        client.get("/api/v1/microgrid/microgrid_002")
+        with count_queries(async_engine.sync_engine) as queries:
+            response = client.get("/api/v1/microgrid/microgrid_002/status")
+        assert response.status_code == 200
+        assert response.json()["diesel"]["status"] == 'off'
+        assert len(queries) == 1
+
+    def test_system_status_caches_generator_status(self, client, async_engine):
+        """Repeat polls reuse the cached generator status instead of joining the configuration"""
+        client.get("/api/v1/microgrid/microgrid_001/status")
+        with count_queries(async_engine.sync_engine) as queries:
+            response = client.get("/api/v1/microgrid/microgrid_001/status")
+        assert response.status_code == 200
+        assert response.json()["diesel"]["status"] == 'off'
+        assert len(queries) == 1
+        assert "system_configurations" not in queries[0]
+
+    def test_update_diesel_status(self, client, async_engine):
+        """Generator status update looks up the microgrid and upserts its configuration"""
+        with count_queries(async_engine.sync_engine) as queries:
+            response = client.put("/api/v1/microgrid/microgrid_001/status/diesel", params={"status": "on"})
+        assert response.status_code == 200
+        assert response.json()["diesel_status"] == 'running'
+        assert sum(q.lstrip().upper().startswith("SELECT") for q in queries) == 1
+
+        response = client.get("/api/v1/microgrid/microgrid_001/status")
+        assert response.json()["diesel"]["status"] == 'running'
+
+        response = client.put("/api/v1/microgrid/microgrid_002/status/diesel", params={"status": "standby"})
+        assert response.status_code == 200
+        response = client.get("/api/v1/microgrid/microgrid_002/status")
+        assert response.json()["diesel"]["status"] == 'standby'
+
+    def test_get_microgrid_lookup_is_cached(self, client, async_engine):
+        """Microgrid lookups are shared across requests and endpoints"""
+        with count_queries(async_engine.sync_engine) as queries:
+            assert client.get("/api/v1/microgrid/microgrid_001").status_code == 200
+        assert len(queries) == 1
+
+        with count_queries(async_engine.sync_engine) as queries:
+            assert client.get("/api/v1/microgrid/microgrid_001").status_code == 200
+        assert queries == []
+
+        response = client.get("/api/v1/microgrid/unknown_grid")
+        assert response.status_code == 404
+        assert "microgrid_001" in response.json()["detail"]
+
+    def test_get_microgrid_etag(self, client, async_engine):
+        """Repeat requests carrying the ETag get an empty 304"""
+        response = client.get("/api/v1/microgrid/microgrid_001")
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+
+        response = client.get("/api/v1/microgrid/microgrid_001", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+        response = client.get("/api/v1/microgrid/microgrid_001", headers={"If-None-Match": '"stale"'})
+        assert response.status_code == 200
+
+    def test_list_microgrids_query_count(self, client, async_engine):
+        """Listing microgrids is a single query"""
+        with count_queries(async_engine.sync_engine) as queries:
+            response = client.get("/api/v1/microgrid/")
+        assert response.status_code == 200
+        assert len(queries) == 1
+        assert sorted(mg["id"] for mg in response.json()) == ['microgrid_001', 'microgrid_002']
+
+    def test_list_microgrids_pagination(self, client, async_engine):
+        """limit/offset page through microgrids in id order"""
+        response = client.get("/api/v1/microgrid/", params={"limit": 1, "offset": 1})
+        assert response.status_code == 200
+        assert [mg["id"] for mg in response.json()] == ['microgrid_002']
+
+        response = client.get("/api/v1/microgrid/", params={"limit": 0})
+        assert response.status_code == 422
+
+    def test_status_queries_are_measured(self, client, async_engine):
+        """Statement latency is labelled by operation and statements are counted per endpoint"""
+        client.get("/api/v1/microgrid/microgrid_001/status")
+        metrics = client.get("/api/v1/metrics").text
+        assert 'db_query_seconds_count{op="microgrid_lookup"}' in metrics
+        assert 'db_query_seconds_count{op="system_status"}' in metrics
+        assert 'db_queries_per_request_count{endpoint="/api/v1/microgrid/{microgrid_id}/status"}' in metrics
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from app.main import app
+from app.api.v1.notifications import _preferences_cache
+from app.models.database import NotificationPreference
+
+
+class TestNotificationsAPI:
+    @pytest.fixture
+    def session_factory(self, api_db):
+        _preferences_cache.clear()
+        return api_db.Session
+
+    @pytest.fixture
+    def client(self, session_factory):
+        return TestClient(app)
+
+    def test_get_defaults(self, client):
+        response = client.get("/api/v1/notifications/preferences/microgrid_001")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["microgrid_id"] == "microgrid_001"
+        assert data["enable_sms"] is True
+        assert data["enable_email"] is False
+
+    def test_update_upserts_one_row(self, client, session_factory):
+        """The first POST creates the preferences, later ones replace them in place"""
+        url = "/api/v1/notifications/preferences/microgrid_001"
+        response = client.post(url, json={"phone_number": "+911234567890", "enable_email": True})
+        assert response.status_code == 200
+        assert response.json()["preferences"]["enable_email"] is True
+
+        # Omitted fields fall back to their defaults
+        response = client.post(url, json={"phone_number": "+919999999999"})
+        assert response.status_code == 200
+        assert response.json()["preferences"]["phone_number"] == "+919999999999"
+        assert response.json()["preferences"]["enable_email"] is False
+
+        with session_factory() as db:
+            rows = db.query(NotificationPreference).all()
+            assert len(rows) == 1
+            assert rows[0].phone_number == "+919999999999"
+
+        # The write invalidated the cached preferences
+        assert client.get(url).json()["phone_number"] == "+919999999999"
+
+    def test_update_unknown_microgrid(self, client, session_factory):
+        response = client.post("/api/v1/notifications/preferences/unknown_grid", json={})
+        assert response.status_code == 404
+        with session_factory() as db:
+            assert db.query(NotificationPreference).count() == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
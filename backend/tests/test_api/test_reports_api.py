@@ -0,0 +1,160 @@
+import pytest
+from fastapi.testclient import TestClient
+from datetime import datetime, timedelta
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from app.main import app
+from app.core.database import get_async_sessionmaker
+from app.api.v1 import reports
+from app.models.database import Microgrid, SensorReading, Forecast, Alert, SystemConfiguration, SensorReadingRollup
+from app.services.sensor_rollups import refresh_sensor_rollups
+
+
+class TestReportsAPI:
+    @pytest.fixture
+    def seed_db(self):
+        def seed(db):
+            now = datetime.utcnow().replace(microsecond=0)
+            db.add(Microgrid(id='microgrid_001', name='Test Grid', latitude=28.4595,
+                             longitude=77.0266, capacity_kw=50.0, created_at=now - timedelta(days=30)))
+            # Readings every 15 minutes over the last 2 hours: 40, 41, ... kW
+            for i in range(8):
+                db.add(SensorReading(microgrid_id='microgrid_001', irradiance=800.0, power_output=40.0 + i,
+                                     temperature=30.0, humidity=40.0, wind_speed=3.0,
+                                     timestamp=now - timedelta(minutes=15 * (8 - i))))
+            # Forecasts 5 minutes after the readings at index 2 and 5, and one far outside the window
+            for i, predictions in ((2, {'5min': {'p50': 45.0}, '15min': {'power_output': 20.0}}),
+                                   (5, {'5min': {'p50': 40.0}})):
+                db.add(Forecast(microgrid_id='microgrid_001', predictions=predictions,
+                                timestamp=now - timedelta(minutes=15 * (8 - i)) + timedelta(minutes=5)))
+            db.add(Forecast(microgrid_id='microgrid_001', predictions={'5min': {'p50': 10.0}},
+                            timestamp=now - timedelta(days=3)))
+            db.add_all([
+                Alert(microgrid_id='microgrid_001', severity='critical', message='Low battery',
+                      action_taken='Switched to battery reserve', timestamp=now - timedelta(hours=1)),
+                Alert(microgrid_id='microgrid_001', severity='warning', message='Cloud cover',
+                      timestamp=now - timedelta(hours=1)),
+                Alert(microgrid_id='microgrid_001', severity='info', message='Forecast updated',
+                      timestamp=now - timedelta(hours=1)),
+            ])
+            db.add(SystemConfiguration(microgrid_id='microgrid_001', generator_fuel_cost_per_liter=100.0,
+                                       generator_fuel_consumption_l_per_kwh=0.2))
+        return seed
+
+    @pytest.fixture
+    def client(self, api_db):
+        reports._report_cache.clear()
+        return TestClient(app)
+
+    def test_performance_report_matches_closest_readings(self, client):
+        """Each forecast is compared with the reading closest in time (within an hour)"""
+        response = client.get("/api/v1/reports/performance/microgrid_001", params={"days": 7})
+        assert response.status_code == 200
+
+        metrics = response.json()["metrics"]
+        assert metrics["forecasts_generated"] == 3
+        assert metrics["sensor_readings"] == 8
+        # |45 - 42| and |40 - 45|; the 3-day-old forecast has no reading within an hour
+        assert metrics["forecast_accuracy_mae"] == 4.0
+        assert response.json()["alerts_by_severity"] == {'critical': 1, 'warning': 1, 'info': 1}
+
+
+    def test_energy_loss_report_aggregates(self, client):
+        """Energy totals and alert counts for the window"""
+        response = client.get("/api/v1/reports/energy-loss/microgrid_001")
+        assert response.status_code == 200
+
+        data = response.json()
+        # 15-minute readings of 40..47 kW, and one forecast step predicting 20 kW
+        assert data["metrics"]["total_actual_energy_kwh"] == 87.0
+        assert data["metrics"]["total_forecast_energy_kwh"] == 5.0
+        assert data["metrics"]["prevented_outages"] == 1
+        assert data["summary"] == {
+            'total_alerts': 2,
+            'critical_alerts': 1,
+            'warning_alerts': 1,
+            'actions_taken': 1
+        }
+
+
+    def test_energy_loss_report_uses_rollups(self, client, api_db):
+        """Materialized buckets are read from the rollup, newer readings from the raw table"""
+        now = datetime.utcnow()
+        with api_db.Session() as db:
+            # Leave the newest readings to the raw query
+            assert refresh_sensor_rollups(db, now=now - timedelta(minutes=45)) > 0
+            newest_bucket = db.query(SensorReadingRollup.bucket).order_by(SensorReadingRollup.bucket.desc()).first()[0]
+            # Readings that were rolled up are no longer needed by the report
+            db.query(SensorReading).filter(
+                SensorReading.timestamp < newest_bucket + timedelta(minutes=15)
+            ).delete()
+            db.commit()
+
+        response = client.get("/api/v1/reports/energy-loss/microgrid_001")
+        assert response.status_code == 200
+        assert response.json()["metrics"]["total_actual_energy_kwh"] == 87.0
+
+    def test_late_readings_are_rolled_up_again(self, client, api_db):
+        """A reading that arrives after its bucket was rolled up is counted after the next refresh"""
+        now = datetime.utcnow()
+        with api_db.Session() as db:
+            assert refresh_sensor_rollups(db, now=now) > 0
+            # Synced hours after it was taken - well behind the refresh lookback
+            db.add(SensorReading(microgrid_id='microgrid_001', irradiance=800.0, power_output=100.0,
+                                 temperature=30.0, humidity=40.0, wind_speed=3.0,
+                                 timestamp=now - timedelta(hours=5)))
+            db.commit()
+            refresh_sensor_rollups(db, now=now)
+
+        response = client.get("/api/v1/reports/energy-loss/microgrid_001")
+        assert response.status_code == 200
+        assert response.json()["metrics"]["total_actual_energy_kwh"] == 87.0 + 25.0
+
+    def test_energy_loss_report_validates_dates(self, client):
+        url = "/api/v1/reports/energy-loss/microgrid_001"
+        response = client.get(url, params={"start_date": "2024-01-01", "end_date": "2024-12-31"})
+        assert response.status_code == 400
+        response = client.get(url, params={"start_date": "01/01/2024"})
+        assert response.status_code == 400
+        response = client.get(url, params={"start_date": "2024-01-31", "end_date": "2024-01-01"})
+        assert response.status_code == 400
+        response = client.get(url, params={"start_date": "2024-01-31", "end_date": "2024-01-31"})
+        assert response.status_code == 200
+        response = client.get(url, params={"start_date": "2024-01-01", "end_date": "2024-01-31"})
+        assert response.status_code == 200
+
+    def test_real_metrics_use_configured_fuel_costs(self, client):
+        """Diesel savings are priced with the microgrid's own fuel settings"""
+        response = client.get("/api/v1/reports/metrics/microgrid_001", params={"period": "week"})
+        assert response.status_code == 200
+
+        data = response.json()
+        assert data["data_points"] == 8
+        # 40..47 kW, each held for 15 minutes
+        assert data["total_energy_kwh"] == 87.0
+        assert data["diesel_savings_rupees"] == round(87.0 * 0.2 * 100.0, 2)
+
+    def test_repeated_reports_are_cached(self, client):
+        """A repeat within the TTL is served without touching the database"""
+        first = {path: client.get(f"/api/v1/reports/{path}/microgrid_001").json()
+                 for path in ("performance", "metrics")}
+
+        # Any database access would now fail the request
+        app.dependency_overrides[get_async_sessionmaker] = lambda: None
+        for path, expected in first.items():
+            response = client.get(f"/api/v1/reports/{path}/microgrid_001")
+            assert response.status_code == 200
+            assert response.json() == expected
+
+    def test_reports_unknown_microgrid(self, client):
+        for path in ("performance", "energy-loss", "metrics"):
+            response = client.get(f"/api/v1/reports/{path}/unknown_grid")
+            assert response.status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,103 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from datetime import datetime
+import asyncio
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
+
+from app.main import app
+from app.models.database import SensorReading
+from app.services import sensor_buffer as sensor_buffer_module
+from app.services.sensor_buffer import SensorReadingBuffer
+
+
+def _reading(power_output: float) -> dict:
+    return {"microgrid_id": "microgrid_001", "irradiance": 800.0, "power_output": power_output,
+            "temperature": 30.0, "humidity": 40.0, "wind_speed": 3.0}
+
+
+class TestSensorsAPI:
+    @pytest.fixture
+    def session_factory(self, api_db):
+        self.async_sessions = api_db.async_sessions
+        return api_db.Session
+
+    @pytest.fixture
+    def client(self, session_factory):
+        return TestClient(app)
+
+    def test_ingest_then_read(self, client):
+        assert client.get("/api/v1/sensors/microgrid_001/latest").status_code == 404
+        for power_output in (10.0, 11.0, 12.0):
+            response = client.post("/api/v1/sensors/reading", json=_reading(power_output))
+            assert response.status_code == 200
+            assert response.json()["id"] is not None
+
+        latest = client.get("/api/v1/sensors/microgrid_001/latest").json()
+        assert latest["power_output"] == 12.0
+        history = client.get("/api/v1/sensors/microgrid_001/history", params={"limit": 2}).json()
+        assert [r["power_output"] for r in history] == [12.0, 11.0]
+
+    def test_bucketed_history(self, client, session_factory):
+        """/history/buckets averages the readings per bucket, newest bucket first"""
+        with session_factory() as db:
+            for minute, power_output in ((1, 10.0), (7, 20.0), (16, 30.0), (29, 50.0)):
+                db.add(SensorReading(timestamp=datetime(2024, 6, 1, 12, minute), **_reading(power_output)))
+            db.commit()
+
+        history = client.get("/api/v1/sensors/microgrid_001/history/buckets",
+                             params={"bucket_minutes": 15, "limit": 2}).json()
+        assert [(r["bucket"], r["readings"], r["power_output"]) for r in history] == [
+            ("2024-06-01T12:15:00", 2, 40.0),
+            ("2024-06-01T12:00:00", 2, 15.0),
+        ]
+        assert len(client.get("/api/v1/sensors/microgrid_001/history/buckets",
+                              params={"bucket_minutes": 15, "limit": 1}).json()) == 1
+        assert client.get("/api/v1/sensors/microgrid_001/history/buckets",
+                          params={"bucket_minutes": 7}).status_code == 400
+
+    def test_buffered_readings_are_written_in_batches(self, session_factory, monkeypatch):
+        """Queued readings are inserted after the flush interval, and the rest when the task stops"""
+        def count():
+            with session_factory() as db:
+                return db.execute(select(func.count(SensorReading.id))).scalar()
+
+        async def ingest():
+            buffer = SensorReadingBuffer(self.async_sessions)
+            task = buffer.start()
+            for power_output in (10.0, 11.0, 12.0):
+                await buffer.put({**_reading(power_output), "timestamp": datetime.utcnow()})
+            await asyncio.sleep(0.5)
+            assert count() == 3
+
+            for power_output in (13.0, 14.0):
+                await buffer.put({**_reading(power_output), "timestamp": datetime.utcnow()})
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            assert count() == 5
+
+            # Cancelled after a batch committed, while its cache invalidation is pending -
+            # the batch must not be inserted again on the way out
+            invalidating = asyncio.Event()
+
+            async def slow_cache_delete(*keys):
+                invalidating.set()
+                await asyncio.sleep(10)
+
+            monkeypatch.setattr(sensor_buffer_module, 'cache_delete', slow_cache_delete)
+            task = buffer.start()
+            await buffer.put({**_reading(15.0), "timestamp": datetime.utcnow()})
+            await invalidating.wait()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(ingest())
+        assert count() == 6
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])